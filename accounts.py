@@ -0,0 +1,31 @@
+import os
+import json
+from dataclasses import dataclass
+
+ACCOUNTS_FILE = os.path.abspath(os.getenv('ACCOUNTS_FILE', 'accounts.json'))
+STATE_DIR = os.path.abspath('account_states')
+
+
+@dataclass
+class Account:
+    name: str
+    username: str
+    password: str
+    storage_state: str = None  # path of the account's saved Playwright storage state
+
+    def __post_init__(self):
+        if not self.storage_state:
+            self.storage_state = os.path.join(STATE_DIR, f'{self.name}.json')
+
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """
+    Read accounts from a JSON list of objects with name, username, password
+    and optionally storage_state. Returns [] when the file does not exist.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return []
+    return [Account(**entry) for entry in entries]
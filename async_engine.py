@@ -0,0 +1,248 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from metrics import metrics
+from accounts import load_accounts, ACCOUNTS_FILE
+from post_button import LOCATE_JS, MARKER_ATTRIBUTE, load_selector_table
+from request_filter import RequestFilter, FIRST_PARTY_DOMAINS
+from session_state import auth_expiry
+from twitter_web import (
+    HEADLESS, HOME_URL, LOGIN_URL, TWITTER_BASE_URL, TWEET_BOX_SELECTOR, COMPOSER_TIMEOUT,
+    CONFIRM_TIMEOUT, POST_BUTTON_DEADLINE, PostRejectedError, _is_create_tweet_response, _extract_tweet_id
+)
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_POSTS = int(os.getenv('MAX_CONCURRENT_POSTS', '4'))
+
+
+class AsyncPostingEngine:
+    """
+    Posts for many accounts from one process: a single Chromium hosts one
+    isolated context per account (each with its own storage state), every
+    account has its own queue so its posts stay ordered, and a semaphore caps
+    how many posts run at the same time.
+    """
+
+    def __init__(self, accounts, concurrency=MAX_CONCURRENT_POSTS, headless=HEADLESS):
+        self.accounts = {account.name: account for account in accounts}
+        self.concurrency = concurrency
+        self.headless = headless
+        self.request_filter = RequestFilter(
+            first_party_domains=FIRST_PARTY_DOMAINS + (urlparse(TWITTER_BASE_URL).hostname,)
+        )
+        self.selector_table = load_selector_table()
+        self._playwright = None
+        self._browser = None
+        self._semaphore = None
+        self._queues = {}
+        self._workers = []
+        self._pages = {}
+
+    async def start(self):
+        self._playwright = await async_playwright().start()
+        with metrics.span('browser_launch'):
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        for name in self.accounts:
+            self._queues[name] = asyncio.Queue()
+            self._workers.append(asyncio.create_task(self._worker(name)))
+        logger.info(f"[Engine] Started for {len(self.accounts)} account(s), concurrency {self.concurrency}.")
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for page in self._pages.values():
+            await page.context.close()
+        self._pages = {}
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    async def post(self, account_name, tweet_text):
+        """Queue a tweet for one account and wait for its result dict."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[account_name].put((tweet_text, future))
+        return await future
+
+    async def post_all(self, tweets_by_account):
+        """
+        Post one tweet per account concurrently. Returns {account: result}
+        where a failed post's result is the exception.
+        """
+        names = list(tweets_by_account)
+        results = await asyncio.gather(
+            *(self.post(name, tweets_by_account[name]) for name in names),
+            return_exceptions=True
+        )
+        return dict(zip(names, results))
+
+    async def _worker(self, name):
+        queue = self._queues[name]
+        while True:
+            tweet_text, future = await queue.get()
+            try:
+                async with self._semaphore:
+                    with metrics.span('engine_post'):
+                        result = await self._post_once(self.accounts[name], tweet_text)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"[Engine] Post for {name} failed: {e}")
+                await self._drop_page(name)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _page_for(self, account):
+        page = self._pages.get(account.name)
+        if page is not None and not page.is_closed():
+            return page
+        state = account.storage_state if os.path.exists(account.storage_state) else None
+        context = await self._browser.new_context(storage_state=state)
+        await self.request_filter.install_async(context)
+        page = await context.new_page()
+        self._pages[account.name] = page
+        return page
+
+    async def _drop_page(self, name):
+        page = self._pages.pop(name, None)
+        if page is not None:
+            try:
+                await page.context.close()
+            except Exception:
+                pass
+
+    async def _post_once(self, account, tweet_text):
+        page = await self._page_for(account)
+        if '/home' not in page.url or not await page.query_selector(TWEET_BOX_SELECTOR):
+            with metrics.span('navigation'):
+                await page.goto(HOME_URL, timeout=60000)
+        if not _cookies_valid(await page.context.cookies()) and not await self._is_logged_in(page):
+            await self._login(page, account)
+        tweet_box = await page.wait_for_selector(TWEET_BOX_SELECTOR, state='visible', timeout=COMPOSER_TIMEOUT * 1000)
+        with metrics.span('fill'):
+            await tweet_box.click()
+            await tweet_box.fill(tweet_text)
+
+        confirmed = await self._submit_and_confirm(page, lambda: page.keyboard.press('Control+Enter'))
+        deadline = time.monotonic() + POST_BUTTON_DEADLINE
+        while not confirmed and time.monotonic() < deadline:
+            metrics.inc('post_button_fallbacks')
+            found = await page.evaluate(LOCATE_JS, {
+                'selectors': self.selector_table['selectors'],
+                'preferred': None,
+                'marker': MARKER_ATTRIBUTE
+            })
+            if found['reason'] == 'ok':
+                button = page.locator(f'[{MARKER_ATTRIBUTE}="1"]').first
+                confirmed = await self._submit_and_confirm(page, button.click)
+            else:
+                await page.wait_for_timeout(500)
+        if not confirmed:
+            raise Exception(f"Post for {account.name} was not confirmed")
+        tweet_id, latency_ms = confirmed
+        return {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'text': tweet_text,
+            'id': tweet_id,
+            'latency_ms': latency_ms,
+            'account': account.name
+        }
+
+    async def _submit_and_confirm(self, page, submit):
+        start = time.monotonic()
+        try:
+            async with page.expect_response(_is_create_tweet_response, timeout=CONFIRM_TIMEOUT * 1000) as response_info:
+                await submit()
+            response = await response_info.value
+        except PlaywrightTimeoutError:
+            metrics.inc('confirm_timeouts')
+            return None
+        latency_ms = round((time.monotonic() - start) * 1000)
+        metrics.observe('confirm', latency_ms)
+        try:
+            payload = await response.json()
+        except Exception:
+            payload = {}
+        if not response.ok or payload.get('errors'):
+            errors = payload.get('errors') or [{'message': f'HTTP {response.status}'}]
+            raise PostRejectedError(f"X rejected the tweet: {errors[0].get('message')}")
+        return _extract_tweet_id(payload), latency_ms
+
+    async def _is_logged_in(self, page):
+        with metrics.span('is_logged_in'):
+            try:
+                await page.wait_for_selector('a[aria-label="Profile"], a[aria-label="Profiel"]', timeout=8000)
+                return True
+            except PlaywrightTimeoutError:
+                return False
+
+    async def _login(self, page, account):
+        with metrics.span('login'):
+            await page.goto(LOGIN_URL, timeout=60000)
+            await page.wait_for_selector('input[name="text"]', timeout=20000)
+            await page.fill('input[name="text"]', account.username)
+            await page.keyboard.press('Enter')
+            await page.wait_for_selector('input[name="password"]', timeout=20000)
+            await page.fill('input[name="password"]', account.password)
+            await page.keyboard.press('Enter')
+            await page.wait_for_selector('a[aria-label="Profile"], a[aria-label="Profiel"]', timeout=20000)
+        metrics.inc('logins')
+        os.makedirs(os.path.dirname(account.storage_state), exist_ok=True)
+        await page.context.storage_state(path=account.storage_state)
+
+
+def _cookies_valid(cookies):
+    expiry = auth_expiry(cookies)
+    return expiry is not None and expiry > time.time()
+
+
+class EngineRunner:
+    """
+    Runs an AsyncPostingEngine on its own event loop thread so synchronous
+    code (the scheduler jobs) can use it.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='posting-engine', daemon=True)
+        self._thread.start()
+        self._call(self.engine.start())
+
+    def post_all(self, tweets_by_account, timeout=None):
+        return self._call(self.engine.post_all(tweets_by_account), timeout)
+
+    def close(self):
+        self._call(self.engine.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _call(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+
+if __name__ == "__main__":
+    # Post one generated tweet for every account in ACCOUNTS_FILE
+    from gemini import GeminiClient
+    from event_log import configure_logging
+    configure_logging()
+    accounts = load_accounts()
+    if not accounts:
+        raise SystemExit(f"No accounts found in {ACCOUNTS_FILE}")
+    tweets = GeminiClient().generate_tweets(len(accounts))
+    runner = EngineRunner(AsyncPostingEngine(accounts))
+    try:
+        for name, result in runner.post_all(dict(zip((a.name for a in accounts), tweets))).items():
+            print(f"{name}: {result}")
+    finally:
+        runner.close()
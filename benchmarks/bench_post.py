@@ -0,0 +1,237 @@
+"""
+Offline benchmark for the posting path.
+
+Serves a fake X (benchmarks/fake_x.py) on localhost, points TwitterWebClient
+at it and posts N tweets, either through the client alone or through the
+whole KoiiBot pipeline with a stub Gemini, or through the TransportRouter
+(X API transport against the fake's /2/tweets, browser as fallback). The
+`many` and `thread` modes post all N tweets in one bulk call on a single
+page (a burst, or a reply chain) and report per-tweet timings.
+Reports latency percentiles, throughput, RSS and the number of Chromium
+processes.
+
+    python benchmarks/bench_post.py --posts 20
+    python benchmarks/bench_post.py --mode pipeline --gemini-latency 800 --disabled-ms 1500 --detach
+    python benchmarks/bench_post.py --mode router --api-error-rate 0.2
+    python benchmarks/bench_post.py --mode thread --posts 6
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from fake_x import FakeXConfig, FakeXServer
+from stub_gemini import StubGeminiClient
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def process_stats():
+    """(rss_mb of this process and its children, number of Chromium processes)."""
+    if psutil is not None:
+        me = psutil.Process()
+        procs = [me] + me.children(recursive=True)
+        rss = 0
+        chromium = 0
+        for proc in procs:
+            try:
+                rss += proc.memory_info().rss
+                if 'chrom' in proc.name().lower() or 'headless_shell' in proc.name().lower():
+                    chromium += 1
+            except psutil.Error:
+                pass
+        return rss / 2**20, chromium
+    if not os.path.isdir('/proc'):
+        return None, None
+    # Linux fallback: walk /proc for descendants of this process
+    parents = {}
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            parents[int(pid)] = int(fields[1])
+        except (OSError, IndexError):
+            pass
+    tree = {os.getpid()}
+    changed = True
+    while changed:
+        children = {pid for pid, ppid in parents.items() if ppid in tree} - tree
+        changed = bool(children)
+        tree |= children
+    rss = 0
+    chromium = 0
+    for pid in tree:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+            rss += int(status.get('VmRSS', '0 kB').split()[0]) * 1024
+            name = status.get('Name', '').strip().lower()
+            if 'chrom' in name or 'headless_shell' in name:
+                chromium += 1
+        except OSError:
+            pass
+    return rss / 2**20, chromium
+
+
+def run(args):
+    server = FakeXServer(FakeXConfig(
+        disabled_ms=args.disabled_ms,
+        detach=args.detach,
+        shortcut=not args.no_shortcut,
+        post_latency_ms=args.post_latency,
+        api_latency_ms=args.api_latency,
+        api_error_rate=args.api_error_rate,
+    )).start()
+    workdir = tempfile.mkdtemp(prefix='koii-bench-')
+    os.environ.update({
+        'TWITTER_BASE_URL': server.base_url,
+        'TWITTER_API_BASE_URL': server.base_url,
+        'TWITTER_API_BEARER_TOKEN': server.config.api_token,
+        'TWITTER_USERNAME': 'bench',
+        'TWITTER_PASSWORD': 'bench',
+        'HEADLESS': 'true',
+        'METRICS_PORT': '0',
+        'POST_TRANSPORTS': args.transports,
+    })
+    # Every state file (profile, history, buffer, index) lands in the scratch dir
+    os.chdir(workdir)
+
+    from metrics import metrics
+    if args.mode in ('many', 'thread'):
+        return run_bulk(args, server)
+    if args.mode == 'client':
+        from twitter_web import TwitterWebClient
+        client = TwitterWebClient()
+        post = lambda i: client.post_tweet_web(f"Benchmark post {i} about $KOII")
+        shutdown = client.close
+    elif args.mode == 'router':
+        from twitter_web import TwitterWebClient
+        from transport import BrowserTransport, HttpApiTransport, TransportRouter
+        router = TransportRouter([HttpApiTransport(), BrowserTransport(TwitterWebClient())])
+        post = lambda i: router.post(f"Benchmark post {i} about $KOII")
+        shutdown = router.close
+    else:
+        import main
+        bot = main.KoiiBot(gemini_client=StubGeminiClient(latency_ms=args.gemini_latency))
+        if args.warm_buffer:
+            bot.tweet_buffer.refill()
+        post = lambda i: bot.post_tweet()
+        shutdown = bot.transport.close
+
+    latencies = []
+    failures = 0
+    peak_rss = 0.0
+    peak_chromium = 0
+    started = time.perf_counter()
+    for i in range(args.posts):
+        t0 = time.perf_counter()
+        try:
+            post(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            failures += 1
+            print(f"post {i} failed: {e}", file=sys.stderr)
+        rss, chromium = process_stats()
+        if rss is not None:
+            peak_rss = max(peak_rss, rss)
+            peak_chromium = max(peak_chromium, chromium)
+    elapsed = time.perf_counter() - started
+    shutdown()
+    server.stop()
+
+    report = {
+        'mode': args.mode,
+        'posts': args.posts,
+        'failures': failures,
+        'throughput_posts_per_s': round(len(latencies) / elapsed, 3) if elapsed else None,
+        'peak_rss_mb': round(peak_rss, 1),
+        'peak_chromium_processes': peak_chromium,
+        'stages': metrics.snapshot()['stages'],
+        'gauges': metrics.snapshot()['gauges'],
+    }
+    if latencies:
+        report.update({
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'first_post_ms': round(latencies[0], 1),
+        })
+    print(json.dumps(report, indent=2))
+    return 0 if not failures else 1
+
+
+def run_bulk(args, server):
+    """Post all N tweets in one post_many/post_thread call."""
+    from metrics import metrics
+    from twitter_web import TwitterWebClient
+    client = TwitterWebClient()
+    texts = [f"Benchmark {args.mode} part {i + 1}/{args.posts} about $KOII" for i in range(args.posts)]
+    bulk = client.post_thread if args.mode == 'thread' else client.post_many
+    started = time.perf_counter()
+    results = bulk(texts)
+    elapsed = time.perf_counter() - started
+    rss, chromium = process_stats()
+    client.close()
+    server.stop()
+
+    posted = [r for r in results if 'error' not in r]
+    for r in results:
+        if 'error' in r:
+            print(f"post failed: {r['error']}", file=sys.stderr)
+    latencies = [r['elapsed_ms'] for r in posted]
+    report = {
+        'mode': args.mode,
+        'posts': args.posts,
+        'failures': len(results) - len(posted),
+        'throughput_posts_per_s': round(len(posted) / elapsed, 3) if elapsed else None,
+        'total_ms': round(elapsed * 1000, 1),
+        'peak_rss_mb': round(rss, 1) if rss is not None else None,
+        'peak_chromium_processes': chromium,
+        'stages': metrics.snapshot()['stages'],
+    }
+    if args.mode == 'thread':
+        # Every part after the first must reply to the part before it
+        ids = [r.get('id') for r in results]
+        report['chain_intact'] = all(server.replies.get(ids[i]) == ids[i - 1] for i in range(1, len(ids)))
+    if latencies:
+        report.update({
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'first_post_ms': latencies[0],
+        })
+    print(json.dumps(report, indent=2))
+    return 0 if len(posted) == len(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=10)
+    parser.add_argument('--mode', choices=('client', 'pipeline', 'router', 'many', 'thread'), default='client')
+    parser.add_argument('--gemini-latency', type=int, default=800, help='stub Gemini latency in ms')
+    parser.add_argument('--warm-buffer', action='store_true', help='fill the tweet buffer before timing')
+    parser.add_argument('--disabled-ms', type=int, default=0, help='Post button disabled time after typing')
+    parser.add_argument('--detach', action='store_true', help='replace the composer node after each post')
+    parser.add_argument('--no-shortcut', action='store_true', help='make Ctrl+Enter do nothing')
+    parser.add_argument('--post-latency', type=int, default=50, help='CreateTweet server latency in ms')
+    parser.add_argument('--transports', default='browser', help='POST_TRANSPORTS for pipeline mode')
+    parser.add_argument('--api-latency', type=int, default=20, help='/2/tweets server latency in ms')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='fraction of API posts refused with 429')
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
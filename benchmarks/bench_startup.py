@@ -0,0 +1,125 @@
+"""
+Startup benchmark.
+
+Measures, each in a fresh interpreter:
+  - import time of main and of the heavy modules it no longer imports up front
+  - time from interpreter start to the scheduler running its first job
+  - time until `main.py --headless` answers on /status
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+HEAVY_MODULES = ('gemini', 'twitter_web', 'transport', 'dashboard', 'scheduler', 'async_engine')
+
+IMPORT_SCRIPT = """
+import sys, time
+t0 = time.perf_counter()
+import {module}
+print((time.perf_counter() - t0) * 1000)
+"""
+
+FIRST_JOB_SCRIPT = """
+import sys, time, threading
+t0 = time.perf_counter()
+sys.path.insert(0, {bench_dir!r})
+import main
+from stub_gemini import StubGeminiClient
+bot = main.KoiiBot(gemini_client=StubGeminiClient(latency_ms=0))
+fired = threading.Event()
+bot.start()
+bot.scheduler.scheduler.add_job(fired.set, jobstore='memory')  # no trigger: runs as soon as the scheduler can
+fired.wait(30)
+print((time.perf_counter() - t0) * 1000)
+bot.stop()
+"""
+
+
+def _env(port='0'):
+    env = dict(os.environ)
+    # Blank credentials (load_dotenv never overrides set variables) so a
+    # catch-up post of a missed slot fails fast instead of reaching real X/Gemini
+    env.update({
+        'PYTHONPATH': REPO_ROOT,
+        'METRICS_PORT': port,
+        'TWEET_BUFFER_DEPTH': '0',
+        'GEMINI_API_KEY': 'bench',
+        'TWITTER_USERNAME': '',
+        'TWITTER_PASSWORD': '',
+        'TWITTER_API_BEARER_TOKEN': '',
+        'POST_TRANSPORTS': 'browser',
+        'TWITTER_BASE_URL': 'http://127.0.0.1:9',
+    })
+    return env
+
+
+def _run_script(script, workdir):
+    out = subprocess.run([sys.executable, '-c', script], cwd=workdir, env=_env(),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_to_status(workdir, timeout=60):
+    """Time from spawning `main.py --headless` until /status answers, in ms."""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'main.py'), '--headless'],
+                               cwd=workdir, env=_env(str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/status', timeout=1) as response:
+                    json.load(response)
+                return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def median(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    # State files (history, index, buffer) land in a scratch dir
+    workdir = tempfile.mkdtemp(prefix='koii-startup-')
+
+    report = {'runs': args.runs, 'import_ms': {}}
+    for module in ('main',) + HEAVY_MODULES:
+        samples = [_run_script(IMPORT_SCRIPT.format(module=module), workdir) for _ in range(args.runs)]
+        report['import_ms'][module] = round(median(samples), 1)
+    samples = [_run_script(FIRST_JOB_SCRIPT.format(bench_dir=BENCH_DIR), workdir) for _ in range(args.runs)]
+    report['first_scheduled_job_ms'] = round(median(samples), 1)
+    samples = [time_to_status(workdir) for _ in range(args.runs)]
+    samples = [s for s in samples if s is not None]
+    report['headless_status_ms'] = round(median(samples), 1) if samples else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark for tweet_length.py.
+
+Builds a corpus of synthetic tweets (plain ASCII, accented Latin, CJK, emoji
+sequences, URLs, and overlong texts) and reports the cost per call of
+weighted_length, validate_tweet and truncate next to plain len().
+
+    python benchmarks/bench_tweet_length.py --size 100000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from tweet_length import weighted_length, truncate
+
+WORDS = [
+    "$KOII", "nodes", "earn", "rewards", "for", "running", "decentralized", "tasks", "on", "spare",
+    "hardware", "creators", "keep", "ownership", "of", "their", "data", "community", "network",
+]
+ACCENTED = ["données", "réseau", "nodos", "über", "señal", "çalışan"]
+CJK = ["去中心化", "ノード", "報酬", "데이터", "任务"]
+EMOJI = ["🚀", "🔥", "👍🏽", "👩‍💻", "🇳🇱", "1️⃣", "❤️", "👨‍👩‍👧‍👦"]
+URLS = ["https://www.koii.network/tasks", "koii.network", "https://t.co/AbCdEf123"]
+
+
+def make_tweet(rng):
+    kind = rng.random()
+    words = rng.choices(WORDS, k=rng.randint(12, 45))
+    if kind > 0.5:
+        pool = ACCENTED if kind < 0.65 else CJK if kind < 0.8 else EMOJI if kind < 0.95 else URLS
+        for _ in range(rng.randint(1, 6)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(pool))
+    text = ' '.join(words)
+    return text + ('.' if rng.random() < 0.7 else '')
+
+
+def per_call_us(fn, corpus, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best / len(corpus) * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    corpus = [make_tweet(rng) for _ in range(args.size)]
+    from gemini import validate_tweet
+    report = {
+        'corpus_size': len(corpus),
+        'overweight': sum(weighted_length(t) > 280 for t in corpus),
+        'len_over_280': sum(len(t) > 280 for t in corpus),
+        'us_per_call': {
+            'len': per_call_us(len, corpus, args.repeat),
+            'weighted_length': per_call_us(weighted_length, corpus, args.repeat),
+            'validate_tweet': per_call_us(validate_tweet, corpus, args.repeat),
+            'truncate': per_call_us(truncate, corpus, args.repeat),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Local stand-in for the parts of X that TwitterWebClient touches: the login
+flow, /home with the composer, status pages (/i/status/<id>) whose composer
+posts replies, and the CreateTweet endpoint. It also serves
+the X API v2 POST /2/tweets endpoint used by HttpApiTransport, sharing the
+same post store.
+
+Quirks seen on the real site can be switched on through FakeXConfig:
+a Post button that stays disabled for a while after typing, a composer that
+is replaced (detaching old element handles) after each post, a broken
+Ctrl+Enter shortcut, slow CreateTweet responses and duplicate rejection.
+The API endpoint can be made slow or flaky to exercise transport fallback.
+"""
+import json
+import time
+import random
+import threading
+from dataclasses import dataclass, asdict
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+@dataclass
+class FakeXConfig:
+    disabled_ms: int = 0  # Post button stays disabled this long after each edit
+    detach: bool = False  # replace the composer node after posting
+    shortcut: bool = True  # whether Ctrl+Enter posts
+    post_latency_ms: int = 50  # server-side delay of CreateTweet
+    reject_duplicates: bool = True
+    timeline_images: int = 20  # images on /home, to exercise request blocking
+    image_bytes: int = 50_000
+    api_latency_ms: int = 20  # server-side delay of POST /2/tweets
+    api_error_rate: float = 0.0  # fraction of API posts refused with HTTP 429
+    api_token: str = 'bench-token'  # bearer token the API endpoint accepts
+
+
+LOGIN_HTML = """<!doctype html>
+<html><head><title>Log in to X</title></head>
+<body>
+<input name="text" autocomplete="username">
+<input name="password" type="password" style="display:none">
+<script>
+const user = document.querySelector('input[name="text"]');
+const pass = document.querySelector('input[name="password"]');
+user.addEventListener('keydown', e => {
+    if (e.key === 'Enter') { user.style.display = 'none'; pass.style.display = ''; pass.focus(); }
+});
+pass.addEventListener('keydown', async e => {
+    if (e.key !== 'Enter') return;
+    await fetch('/session', {method: 'POST', body: JSON.stringify({user: user.value})});
+    location.href = '/home';
+});
+</script>
+</body></html>"""
+
+HOME_HTML = """<!doctype html>
+<html><head><title>Home / X</title></head>
+<body>
+<nav><a aria-label="Profile" href="/profile">Profile</a></nav>
+<main>
+  <div id="composer"></div>
+  <section aria-label="Timeline: Your Home Timeline">__TIMELINE__</section>
+</main>
+<script>
+const cfg = __CONFIG__;
+const replyTo = (location.pathname.match(/^\/i\/status\/(\d+)/) || [])[1];
+let enableTimer = null;
+function composer() {
+    const wrap = document.createElement('div');
+    wrap.innerHTML = '<div data-testid="tweetTextarea_0" aria-label="Tweet text" role="textbox" contenteditable="true"></div>'
+        + '<button data-testid="tweetButtonInline" type="button" disabled aria-disabled="true">Post</button>';
+    return wrap;
+}
+const box = () => document.querySelector('[data-testid="tweetTextarea_0"]');
+const button = () => document.querySelector('[data-testid="tweetButtonInline"]');
+function setDisabled(disabled) {
+    button().disabled = disabled;
+    button().setAttribute('aria-disabled', String(disabled));
+}
+function update() {
+    clearTimeout(enableTimer);
+    setDisabled(true);
+    if (box().innerText.trim()) enableTimer = setTimeout(() => setDisabled(false), cfg.disabled_ms);
+}
+async function post() {
+    const text = box().innerText.trim();
+    if (!text || button().disabled) return;
+    setDisabled(true);
+    await fetch('/i/api/graphql/fake/CreateTweet', {
+        method: 'POST',
+        headers: {'content-type': 'application/json'},
+        body: JSON.stringify({variables: replyTo
+            ? {tweet_text: text, reply: {in_reply_to_tweet_id: replyTo}}
+            : {tweet_text: text}})
+    });
+    if (cfg.detach) {
+        document.getElementById('composer').replaceChildren(composer());
+    } else {
+        box().innerText = '';
+    }
+    update();
+}
+document.getElementById('composer').appendChild(composer());
+document.addEventListener('input', update);
+document.addEventListener('keydown', e => {
+    if (cfg.shortcut && e.ctrlKey && e.key === 'Enter') post();
+});
+document.addEventListener('click', e => {
+    if (e.target.closest('[data-testid="tweetButtonInline"]')) post();
+});
+</script>
+</body></html>"""
+
+
+class FakeXServer:
+    """Threaded HTTP server serving the fake X pages on 127.0.0.1."""
+
+    def __init__(self, config=None, port=0):
+        self.config = config or FakeXConfig()
+        self.posts = []
+        self.replies = {}  # rest_id -> rest_id of the post it replies to
+        self._lock = threading.Lock()
+        handler = type('Handler', (_Handler,), {'fake': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-x', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def create_tweet(self, text, in_reply_to=None):
+        """Record a post; returns (status, payload) like the CreateTweet endpoint."""
+        with self._lock:
+            if self.config.reject_duplicates and text in self.posts:
+                return 403, {'errors': [{'message': 'Status is a duplicate. (187)', 'code': 187}]}
+            self.posts.append(text)
+            rest_id = str(1_800_000_000_000_000_000 + len(self.posts))
+            if in_reply_to:
+                self.replies[rest_id] = in_reply_to
+        return 200, {'data': {'create_tweet': {'tweet_results': {'result': {'rest_id': rest_id}}}}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/login':
+            self._send(200, LOGIN_HTML, 'text/html')
+        elif path == '/home' or path.startswith('/i/status/'):
+            if not self._logged_in():
+                self.send_response(302)
+                self.send_header('Location', '/login')
+                self.end_headers()
+                return
+            timeline = ''.join(
+                f'<article><img src="/media/{i}.jpg" width="200" height="100"><p>Post {i}</p></article>'
+                for i in range(self.fake.config.timeline_images)
+            )
+            html = HOME_HTML.replace('__CONFIG__', json.dumps(asdict(self.fake.config)))
+            self._send(200, html.replace('__TIMELINE__', timeline), 'text/html')
+        elif path.startswith('/media/'):
+            self._send(200, b'\0' * self.fake.config.image_bytes, 'image/jpeg')
+        else:
+            self._send(404, 'Not found', 'text/plain')
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if path == '/session':
+            self.send_response(204)
+            self.send_header('Set-Cookie', 'auth_token=fake; Path=/; Max-Age=31536000')
+            self.send_header('Set-Cookie', 'ct0=fake; Path=/; Max-Age=31536000')
+            self.end_headers()
+        elif path == '/2/tweets':
+            self._api_create_tweet(body)
+        elif path.endswith('/CreateTweet'):
+            time.sleep(self.fake.config.post_latency_ms / 1000)
+            variables = json.loads(body or b'{}').get('variables', {})
+            in_reply_to = variables.get('reply', {}).get('in_reply_to_tweet_id')
+            status, payload = self.fake.create_tweet(variables.get('tweet_text', ''), in_reply_to)
+            self._send(status, json.dumps(payload), 'application/json')
+        else:
+            self._send(404, 'Not found', 'text/plain')
+
+    def _api_create_tweet(self, body):
+        config = self.fake.config
+        time.sleep(config.api_latency_ms / 1000)
+        if self.headers.get('Authorization') != f'Bearer {config.api_token}':
+            self._send(401, json.dumps({'title': 'Unauthorized', 'status': 401}), 'application/json')
+            return
+        if random.random() < config.api_error_rate:
+            self._send(429, json.dumps({'title': 'Too Many Requests', 'status': 429}), 'application/json')
+            return
+        text = json.loads(body or b'{}').get('text', '')
+        status, payload = self.fake.create_tweet(text)
+        if status != 200:
+            detail = payload['errors'][0]['message']
+            self._send(403, json.dumps({'detail': f'You are not allowed to create a Tweet with duplicate content. {detail}',
+                                        'status': 403}), 'application/json')
+            return
+        rest_id = payload['data']['create_tweet']['tweet_results']['result']['rest_id']
+        self._send(201, json.dumps({'data': {'id': rest_id, 'text': text}}), 'application/json')
+
+    def _logged_in(self):
+        cookies = SimpleCookie(self.headers.get('Cookie', ''))
+        return 'auth_token' in cookies
+
+    def _send(self, status, body, content_type):
+        data = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
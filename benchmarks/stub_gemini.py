@@ -0,0 +1,52 @@
+"""
+Drop-in replacement for GeminiClient that returns canned, always-unique
+tweets after a configurable delay, so benchmarks never call the real API.
+"""
+import time
+import random
+import itertools
+
+OPENERS = [
+    "Node operators", "Creators", "Builders", "Communities", "Developers",
+    "Everyday users", "Small teams", "Data owners",
+]
+TOPICS = [
+    "earn $KOII by running decentralized tasks on spare hardware",
+    "keep ownership of their data while $KOII rewards their contributions",
+    "use $KOII to pay for compute that no single company controls",
+    "get $KOII rewards for keeping the network honest and online",
+    "publish tasks that thousands of $KOII nodes pick up in minutes",
+]
+
+
+class StubGeminiClient:
+    """Mimics GeminiClient's public API with synthetic latency."""
+
+    def __init__(self, dedup_index=None, latency_ms=800, jitter_ms=200, seed=0):
+        self.dedup_index = dedup_index
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._counter = itertools.count(1)
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0, delay) / 1000)
+
+    def _tweet(self):
+        n = next(self._counter)
+        return f"{self._random.choice(OPENERS)} {self._random.choice(TOPICS)}. Benchmark run #{n}."
+
+    def generate_tweet(self, use_fallback=True):
+        self._wait()
+        return self._tweet()
+
+    def generate_tweets(self, n):
+        self._wait()
+        return [self._tweet() for _ in range(n)]
+
+    def generate_thread(self, n):
+        self._wait()
+        return [f"{i}/{n} {self._tweet()}" for i in range(1, n + 1)]
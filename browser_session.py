@@ -0,0 +1,164 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from playwright.sync_api import sync_playwright
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RECYCLE_AFTER_POSTS = int(os.getenv('BROWSER_RECYCLE_POSTS', '25'))
+IDLE_TIMEOUT = float(os.getenv('BROWSER_IDLE_TIMEOUT', '1800'))  # seconds
+
+
+class BrowserSession:
+    """
+    Long-lived browser session: one Playwright instance, one persistent
+    Chromium context and one warm page that is reused between posts.
+
+    Playwright's sync API is bound to the thread that started it, while the
+    scheduler may call us from any of its worker threads, so every browser
+    call is funnelled through a single dedicated thread.
+    """
+
+    def __init__(self, user_data_dir, headless=True, home_url='https://twitter.com/home',
+                 ready_selector=None, recycle_after=RECYCLE_AFTER_POSTS, idle_timeout=IDLE_TIMEOUT,
+                 request_filter=None, on_launch=None):
+        self.user_data_dir = user_data_dir
+        self.headless = headless
+        self.home_url = home_url
+        self.ready_selector = ready_selector
+        self.recycle_after = recycle_after
+        self.idle_timeout = idle_timeout
+        self.request_filter = request_filter
+        self.on_launch = on_launch  # called with each freshly launched context
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='browser')
+        self._playwright = None
+        self._context = None
+        self._page = None
+        self._uses = 0
+        self._last_used = 0.0
+        self._idle_timer = None
+        self._timer_lock = threading.Lock()
+
+    def run(self, fn, *args):
+        """Run fn(page, *args) on the browser thread and return its result."""
+        self._cancel_idle_timer()
+        try:
+            return self._executor.submit(self._run, fn, *args).result()
+        finally:
+            self._arm_idle_timer()
+
+    def warm(self, page):
+        """
+        Make sure the page is showing /home with the composer ready.
+        Only navigates when the health check fails; returns True if it did.
+        """
+        try:
+            if '/home' in page.url and (
+                self.ready_selector is None or page.query_selector(self.ready_selector)
+            ):
+                page.evaluate('window.scrollTo(0, 0)')
+                return False
+        except Exception as e:
+            logger.debug(f"[Browser] Health check failed, re-navigating: {e}")
+        with metrics.span('navigation'):
+            page.goto(self.home_url, timeout=60000)
+        return True
+
+    def recycle(self):
+        """Close the current context; the next run() launches a fresh one."""
+        self._executor.submit(self._close).result()
+
+    def close(self):
+        """Close the browser and stop the browser thread."""
+        self._cancel_idle_timer()
+        self._executor.submit(self._shutdown).result()
+        self._executor.shutdown(wait=True)
+
+    # --- browser thread only below this line ---
+
+    def _run(self, fn, *args):
+        if self._context is not None and self._needs_recycle():
+            logger.info(f"[Browser] Recycling context after {self._uses} posts.")
+            metrics.inc('browser_recycles')
+            self._close()
+        page = self._ensure_page()
+        self._uses += 1
+        try:
+            return fn(page, *args)
+        except Exception:
+            # A page that failed mid-post is in an unknown state; start clean next time
+            self._close()
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+    def _needs_recycle(self):
+        if self.recycle_after and self._uses >= self.recycle_after:
+            return True
+        return self.idle_timeout and time.monotonic() - self._last_used > self.idle_timeout
+
+    def _ensure_page(self):
+        if self._page is not None and not self._page.is_closed():
+            return self._page
+        if self._context is None:
+            if self._playwright is None:
+                self._playwright = sync_playwright().start()
+            logger.info("[Browser] Launching persistent Chromium context.")
+            with metrics.span('browser_launch'):
+                self._context = self._playwright.chromium.launch_persistent_context(
+                    self.user_data_dir,
+                    headless=self.headless,
+                    args=["--start-maximized"]
+                )
+            metrics.inc('browser_launches')
+            if self.request_filter is not None:
+                self.request_filter.install(self._context)
+            if self.on_launch is not None:
+                self.on_launch(self._context)
+            self._uses = 0
+        # A persistent context opens with one blank page; reuse it instead of leaking it
+        pages = [p for p in self._context.pages if not p.is_closed()]
+        self._page = pages[0] if pages else self._context.new_page()
+        return self._page
+
+    def _close(self):
+        if self._context is not None:
+            try:
+                self._context.close()
+            except Exception as e:
+                logger.warning(f"[Browser] Error closing context: {e}")
+        self._context = None
+        self._page = None
+        self._uses = 0
+
+    def _close_if_idle(self):
+        if self._context is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+            logger.info("[Browser] Closing idle context.")
+            self._close()
+
+    def _shutdown(self):
+        self._close()
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    # --- idle timer ---
+
+    def _arm_idle_timer(self):
+        if not self.idle_timeout:
+            return
+        with self._timer_lock:
+            self._idle_timer = threading.Timer(
+                self.idle_timeout, lambda: self._executor.submit(self._close_if_idle)
+            )
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        with self._timer_lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
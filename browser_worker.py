@@ -0,0 +1,245 @@
+import os
+import signal
+import logging
+import threading
+import multiprocessing
+from metrics import metrics
+from event_log import LOG_QUEUE_SIZE, forward_records, levels
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+USE_BROWSER_WORKER = os.getenv('BROWSER_WORKER', 'false').lower() == 'true'
+WORKER_MAX_POSTS = int(os.getenv('WORKER_MAX_POSTS', '50'))
+WORKER_MAX_RSS_MB = float(os.getenv('WORKER_MAX_RSS_MB', '1500'))
+WORKER_POST_DEADLINE = float(os.getenv('WORKER_POST_DEADLINE', '180'))  # seconds
+WORKER_START_TIMEOUT = 30  # seconds
+POSTING_METHODS = ('post_tweet_web', 'post_many', 'post_thread')  # client methods the worker serves
+
+
+def process_tree_rss_mb(pid=None):
+    """RSS of a process plus all its descendants (the browser), in MB."""
+    pid = pid or os.getpid()
+    if psutil is not None:
+        root = psutil.Process(pid)
+        total = 0
+        for proc in [root] + root.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 2**20
+    if not os.path.isdir('/proc'):
+        return None
+    parents = {}
+    for entry in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            pass
+    tree = {pid}
+    while True:
+        children = {p for p, parent in parents.items() if parent in tree} - tree
+        if not children:
+            break
+        tree |= children
+    total = 0
+    for member in tree:
+        try:
+            with open(f'/proc/{member}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, IndexError, ValueError):
+            pass
+    return total / 2**20
+
+
+def _kill_children(pid):
+    """Kill every descendant of a process (needs psutil)."""
+    if psutil is None:
+        logger.warning("[Worker] psutil is not installed, the worker's browser may be left running.")
+        return
+    try:
+        children = psutil.Process(pid).children(recursive=True)
+    except psutil.Error:
+        return
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(children, timeout=5)
+
+
+def _worker_main(conn, log_queue, log_levels):
+    """Child process: owns a TwitterWebClient and serves post requests over the pipe."""
+    if hasattr(os, 'setsid'):
+        os.setsid()  # own process group, so the parent can kill the browser with us
+    from event_log import configure_child_logging
+    from twitter_web import TwitterWebClient
+    # The parent owns the console and the rotating log file; records go there
+    configure_child_logging(log_queue, log_levels)
+    try:
+        client = TwitterWebClient()
+    except Exception as e:
+        conn.send({'ok': False, 'error': str(e), 'metrics': metrics.take()})
+        return
+    conn.send({'ok': True, 'metrics': metrics.take()})
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request['op'] not in POSTING_METHODS:
+            break
+        try:
+            result = getattr(client, request['op'])(*request['args'])
+            response = {'ok': True, 'result': result}
+        except Exception as e:
+            response = {'ok': False, 'error': str(e), 'error_type': type(e).__name__}
+        response['rss_mb'] = process_tree_rss_mb()
+        # Browser stages are timed in this process; the parent serves /metrics
+        response['metrics'] = metrics.take()
+        conn.send(response)
+    try:
+        client.close()
+    finally:
+        conn.close()
+
+
+class BrowserWorker:
+    """
+    Runs TwitterWebClient in a supervised child process with the same
+    post_tweet_web()/post_many()/post_thread()/close() interface.
+
+    Every post has a hard deadline; a worker that misses it is killed
+    together with its browser. Workers are also recycled after
+    WORKER_MAX_POSTS posts or once their process tree exceeds
+    WORKER_MAX_RSS_MB, so memory growth never accumulates in the bot.
+    """
+
+    def __init__(self, max_posts=WORKER_MAX_POSTS, max_rss_mb=WORKER_MAX_RSS_MB,
+                 post_deadline=WORKER_POST_DEADLINE):
+        self.max_posts = max_posts
+        self.max_rss_mb = max_rss_mb
+        self.post_deadline = post_deadline
+        # spawn, not fork: the parent runs Tk and scheduler threads
+        self._mp = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._log_queue = None
+        self._posts = 0
+        self._lock = threading.Lock()
+
+    def post_tweet_web(self, tweet_text: str, trace_id=None) -> dict:
+        return self._call('post_tweet_web', (tweet_text, trace_id))
+
+    def post_many(self, texts) -> list:
+        texts = list(texts)
+        return self._call('post_many', (texts,), posts=len(texts))
+
+    def post_thread(self, texts) -> list:
+        texts = list(texts)
+        return self._call('post_thread', (texts,), posts=len(texts))
+
+    def _call(self, op, args, posts=1):
+        deadline = self.post_deadline * max(1, posts)
+        with self._lock:
+            self._ensure_worker()
+            self._conn.send({'op': op, 'args': args})
+            if not self._conn.poll(deadline):
+                metrics.inc('worker_timeouts')
+                logger.error(f"[Worker] Post exceeded {deadline:.0f}s deadline, killing worker.")
+                self._kill()
+                raise TimeoutError(f"Browser worker did not answer within {deadline:.0f}s")
+            try:
+                response = self._conn.recv()
+            except EOFError:
+                self._kill()
+                raise Exception("Browser worker exited during post")
+            self._posts += posts
+            metrics.merge(response.get('metrics', {}))
+            rss_mb = response.get('rss_mb')
+            if rss_mb is not None:
+                metrics.set_gauge('worker_rss_mb', round(rss_mb, 1))
+            if self._posts >= self.max_posts or (rss_mb and rss_mb > self.max_rss_mb):
+                logger.info(f"[Worker] Recycling after {self._posts} posts ({rss_mb or 0:.0f} MB).")
+                metrics.inc('worker_recycles')
+                self._stop()
+            if not response['ok']:
+                if response.get('error_type') == 'PostRejectedError':
+                    # Final for the router: X refused the content, another transport must not retry it
+                    from twitter_web import PostRejectedError
+                    raise PostRejectedError(response['error'])
+                raise Exception(response['error'])
+            return response['result']
+
+    def close(self):
+        with self._lock:
+            self._stop()
+
+    def _ensure_worker(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        if self._process is not None:
+            self._reset()  # the worker died on its own
+        parent_conn, child_conn = self._mp.Pipe()
+        # A fresh queue per worker: a killed worker may leave its queue unusable
+        log_queue = self._mp.Queue(LOG_QUEUE_SIZE)
+        forward_records(log_queue)
+        process = self._mp.Process(target=_worker_main, args=(child_conn, log_queue, levels()),
+                                   name='koii-browser-worker', daemon=True)
+        process.start()
+        child_conn.close()
+        self._process, self._conn, self._log_queue, self._posts = process, parent_conn, log_queue, 0
+        metrics.inc('worker_starts')
+        if not parent_conn.poll(WORKER_START_TIMEOUT):
+            self._kill()
+            raise TimeoutError("Browser worker did not start")
+        ready = parent_conn.recv()
+        metrics.merge(ready.get('metrics', {}))
+        if not ready['ok']:
+            self._kill()
+            raise Exception(f"Browser worker failed to start: {ready['error']}")
+
+    def _stop(self):
+        """Ask the worker to shut down cleanly, killing it if it does not."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send({'op': 'stop'})
+            self._process.join(30)
+        except (OSError, EOFError):
+            pass
+        if self._process.is_alive():
+            self._kill()
+        else:
+            self._reset()
+
+    def _kill(self):
+        if self._process is None:
+            return
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            # No process groups (Windows), or the worker died before calling setsid():
+            # kill the Playwright driver and Chromium first, they would outlive the worker
+            _kill_children(self._process.pid)
+            self._process.kill()
+        self._process.join(5)
+        self._reset()
+
+    def _reset(self):
+        if self._conn is not None:
+            self._conn.close()
+        if self._log_queue is not None:
+            self._log_queue.put(None)  # stops the forwarder after the worker's last records
+            self._log_queue.cancel_join_thread()  # never hold up exit on a killed worker's queue
+        self._process = None
+        self._conn = None
+        self._log_queue = None
+        self._posts = 0
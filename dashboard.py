@@ -3,20 +3,39 @@ from tkinter import scrolledtext, messagebox
 from threading import Thread
 import queue
 import sys
+import logging
+import datetime
+from collections import deque
+from history import TweetHistory
+from metrics import metrics
+
+LOG_PAGE_SIZE = 50  # tweets loaded per page
+MAX_VISIBLE_ENTRIES = 200  # oldest entries are dropped from the log beyond this
+QUEUE_BATCH_SIZE = 100  # messages handled per drain before yielding to Tk
+IDLE_POLL_MS = 5000  # safety poll in case a wake-up event was missed
+METRICS_REFRESH_MS = 30000
+
+logger = logging.getLogger(__name__)
 
 class Dashboard(tk.Tk):
-    def __init__(self):
+    def __init__(self, history=None):
         super().__init__()
         self.title("KoiiBot Dashboard")
         self.geometry("520x640")
         self.configure(bg="#0E121D")
-        self.tweet_count = 0
-        self.tweet_log = []
+        self.history = history or TweetHistory()
         self.status = "Inactive"
         self.queue = queue.Queue()
+        self._shown_ids = deque()  # ids of the entries in the log, newest first
+        self._oldest_loaded_id = None
+        self._drain_pending = False
         self._build_ui()
+        self._refresh_counters()
+        self._load_older()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
-        self.after(100, self._process_queue)
+        self.bind("<<QueueEvent>>", lambda e: self._process_queue())
+        self.after(IDLE_POLL_MS, self._poll_queue)
+        self.after(METRICS_REFRESH_MS, self._refresh_metrics)
 
     def _build_ui(self):
         # Status Indicator
@@ -28,15 +47,17 @@ class Dashboard(tk.Tk):
         self._update_status_badge("Inactive")
 
         # Daily Tweet Counter
-        self.daily_tweet_count = 0
         self.daily_counter_label = tk.Label(self, text="Tweets sent today: 0", bg="#0E121D", fg="#7EC4FF", font=("Segoe UI", 13, "bold"))
         self.daily_counter_label.pack(pady=(0, 2))
 
         # Tweet Counter
-        self.tweet_count = 0
         self.counter_label = tk.Label(self, text="Tweets Sent: 0", bg="#0E121D", fg="#fff", font=("Segoe UI", 15, "bold"))
         self.counter_label.pack(pady=(0, 2))
 
+        # Post latency summary
+        self.latency_label = tk.Label(self, text="Post latency: no data yet", bg="#0E121D", fg="#9AA3B8", font=("Segoe UI", 10))
+        self.latency_label.pack(pady=(0, 2))
+
         # Tweet Log
         self.log_frame = tk.Frame(self, bg="#0E121D")
         self.log_frame.pack(padx=18, pady=10, fill=tk.BOTH, expand=True)
@@ -46,6 +67,9 @@ class Dashboard(tk.Tk):
         self.log_box.bind("<FocusIn>", lambda e: self.log_box.config(bg="#20243A"))
         self.log_box.bind("<FocusOut>", lambda e: self.log_box.config(bg="#181C2A"))
         self.log_frame.configure(highlightbackground="#23273A", highlightcolor="#23273A", highlightthickness=2, bd=0)
+        self.load_older_label = tk.Label(self, text="Load older tweets", bg="#0E121D", fg="#7EC4FF", font=("Segoe UI", 10, "underline"), cursor="hand2")
+        self.load_older_label.pack(pady=(0, 2))
+        self.load_older_label.bind("<Button-1>", lambda e: self._load_older())
 
         # STOP Badge/Button (aligned with status area)
         self.stop_button = tk.Label(
@@ -89,51 +113,112 @@ class Dashboard(tk.Tk):
         self.status = status
         self._update_status_badge(status)
 
-    def increment_daily_counter(self):
-        self.daily_tweet_count += 1
-        self.daily_counter_label.config(text=f"Tweets sent today: {self.daily_tweet_count}")
-
-    def reset_daily_counter(self):
-        self.daily_tweet_count = 0
-        self.daily_counter_label.config(text="Tweets sent today: 0")
+    def _refresh_counters(self):
+        """Recompute both counters from the history store."""
+        self.daily_counter_label.config(text=f"Tweets sent today: {self.history.count_today()}")
+        self.counter_label.config(text=f"Tweets Sent: {self.history.count_total()}")
+
+    def _refresh_metrics(self):
+        p50 = metrics.percentile('post_total', 50)
+        p99 = metrics.percentile('post_total', 99)
+        if p50 is not None:
+            counters = metrics.snapshot()['counters']
+            self.latency_label.config(
+                text=f"Post latency p50 {p50 / 1000:.1f}s · p99 {p99 / 1000:.1f}s · "
+                     f"retries {counters.get('post_button_retries', 0)} · fallbacks {counters.get('gemini_fallbacks', 0)}"
+            )
+        self.after(METRICS_REFRESH_MS, self._refresh_metrics)
 
     def schedule_daily_reset(self):
-        import datetime
-        import threading
+        """Refresh the counters at midnight so the daily count starts over."""
         now = datetime.datetime.now()
         tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        seconds_until_midnight = (tomorrow - now).total_seconds()
+        ms_until_midnight = int((tomorrow - now).total_seconds() * 1000) + 1000
         def reset_and_reschedule():
-            self.reset_daily_counter()
+            self._refresh_counters()
             self.schedule_daily_reset()
-        threading.Timer(seconds_until_midnight, reset_and_reschedule).start()
+        self.after(ms_until_midnight, reset_and_reschedule)
+
+    def post_event(self, msg_type, data):
+        """Thread-safe: queue a message for the UI and wake the Tk loop to drain it."""
+        self.queue.put((msg_type, data))
+        if self._drain_pending:
+            return
+        self._drain_pending = True
+        try:
+            self.event_generate("<<QueueEvent>>", when="tail")
+        except (RuntimeError, tk.TclError):
+            # Main loop not running yet; the safety poll picks the message up
+            pass
 
     def add_tweet(self, timestamp, text):
-        self.tweet_count += 1
-        self.counter_label.config(text=f"Tweets Sent: {self.tweet_count}")
-        self.increment_daily_counter()
-        self.tweet_log.insert(0, (timestamp, text))
-        self._refresh_log()
-        print(f"[INFO] Tweet added to dashboard at {timestamp}")
-
-    def _refresh_log(self):
+        # The bot has already written the tweet to the history store
+        self._refresh_counters()
+        self._show_new_entries()
+        logger.debug(f"[Dashboard] Tweet added to dashboard at {timestamp}")
+
+    def _entry_text(self, entry):
+        return f"[{entry['timestamp']}]\n{entry['text']}\n\n"
+
+    def _show_new_entries(self):
+        """Insert only the tweets newer than the top entry, then trim the bottom."""
+        newest_id = self._shown_ids[0] if self._shown_ids else None
+        entries = self.history.recent(MAX_VISIBLE_ENTRIES, after_id=newest_id)
+        if not entries:
+            return
         self.log_box.config(state='normal')
-        self.log_box.delete(1.0, tk.END)
-        for ts, txt in self.tweet_log:
-            self.log_box.insert(tk.END, f"[{ts}]\n{txt}\n\n")
+        for entry in reversed(entries):
+            self.log_box.insert('1.0', self._entry_text(entry), f"entry-{entry['id']}")
+            self._shown_ids.appendleft(entry['id'])
+        if len(self._shown_ids) > MAX_VISIBLE_ENTRIES:
+            self.load_older_label.config(text="Load older tweets")
+        while len(self._shown_ids) > MAX_VISIBLE_ENTRIES:
+            tag = f"entry-{self._shown_ids.pop()}"
+            ranges = self.log_box.tag_ranges(tag)
+            if ranges:
+                self.log_box.delete(ranges[0], ranges[-1])
+            self.log_box.tag_delete(tag)
+        self._oldest_loaded_id = self._shown_ids[-1]
         self.log_box.config(state='disabled')
 
+    def _load_older(self):
+        """Append the next page of older tweets to the bottom of the log."""
+        entries = self.history.recent(LOG_PAGE_SIZE, before_id=self._oldest_loaded_id)
+        if not entries:
+            self.load_older_label.config(text="No older tweets")
+            return
+        self.log_box.config(state='normal')
+        for entry in entries:
+            self.log_box.insert(tk.END, self._entry_text(entry), f"entry-{entry['id']}")
+            self._shown_ids.append(entry['id'])
+        self.log_box.config(state='disabled')
+        self._oldest_loaded_id = entries[-1]['id']
+
     def _process_queue(self):
+        """Drain up to QUEUE_BATCH_SIZE messages, rendering new tweets once per batch."""
+        self._drain_pending = False
+        new_tweets = 0
+        last_timestamp = None
         try:
-            while True:
+            for _ in range(QUEUE_BATCH_SIZE):
                 msg_type, data = self.queue.get_nowait()
                 if msg_type == "tweet_success":
-                    self.add_tweet(data['timestamp'], data['text'])
+                    new_tweets += 1
+                    last_timestamp = data['timestamp']
                 elif msg_type == "tweet_error":
                     messagebox.showerror("Error", f"Failed to send tweet: {data}")
         except queue.Empty:
             pass
-        self.after(100, self._process_queue)
+        if new_tweets:
+            self.add_tweet(last_timestamp, None)
+        if not self.queue.empty():
+            self._drain_pending = True
+            self.after_idle(self._process_queue)
+
+    def _poll_queue(self):
+        if not self.queue.empty():
+            self._process_queue()
+        self.after(IDLE_POLL_MS, self._poll_queue)
 
     def on_close(self):
         self.destroy()
@@ -149,7 +234,7 @@ class Dashboard(tk.Tk):
         from tkinter import messagebox
         if messagebox.askokcancel("Stop Bot", "Are you sure you want to stop the bot?"):
             msg = "Bot manually stopped by user. Closing in 10 seconds..."
-            print(msg)
+            logger.info(f"[Dashboard] {msg}")
             self.stop_msg_label.config(text=msg)
             def do_exit():
                 self.destroy()
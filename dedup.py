@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import array
+import pickle
+import random
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.path.abspath('tweet_index.jsonl')
+SNAPSHOT_EVERY = 500  # entries appended after the binary snapshot before it is rewritten
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', '0.6'))  # estimated Jaccard similarity
+
+# MinHash signature of NUM_PERM values split into BANDS bands of ROWS rows for
+# LSH. With 16x3 a pair at similarity 0.6 shares a band ~98% of the time while
+# pairs below 0.3 rarely do, so only a handful of candidates are ever compared.
+INDEX_VERSION = 1
+NUM_PERM = 48
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x4B4F4949)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD_PATTERN = re.compile(r"[\w$']+")
+
+
+def _shingles(text):
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < 3:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def minhash(text):
+    """Return the MinHash signature of a tweet as a tuple of NUM_PERM ints."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+        for s in _shingles(text)
+    ]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class TweetIndex:
+    """
+    Persistent near-duplicate index over every tweet we have posted.
+
+    Signatures are appended to a JSON-lines file and loaded back as-is, so
+    startup never re-hashes history. A binary snapshot next to it
+    (`<path>.snapshot`) holds every signature up to a file offset; startup
+    loads it and parses only the lines appended after that offset. Loading
+    runs on a background thread, so it stays off the startup path; the first
+    lookup waits for it. Lookups hash the candidate once and compare it
+    against the few tweets that share an LSH band with it.
+    """
+
+    def __init__(self, path=INDEX_PATH, threshold=DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._signatures = []
+        self._texts = []
+        self._bands = [dict() for _ in range(BANDS)]
+        self._offset = 0
+        self._snapshot_path = path + '.snapshot'
+        self._snapshot_len = 0  # entries covered by the snapshot on disk
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        threading.Thread(target=self._load, name='dedup-load', daemon=True).start()
+
+    def __len__(self):
+        self._loaded.wait()
+        return len(self._signatures)
+
+    def add(self, text):
+        """Record a posted tweet."""
+        sig = minhash(text)
+        self._loaded.wait()
+        with self._lock:
+            self._load_new()
+            self._insert(sig, text)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'v': INDEX_VERSION, 'sig': _encode(sig), 'text': text}, ensure_ascii=False) + '\n')
+                    self._offset = f.tell()
+            except Exception as e:
+                logger.warning(f"[Dedup] Could not persist index entry: {e}")
+                return
+            if len(self._signatures) - self._snapshot_len >= SNAPSHOT_EVERY:
+                self._save_snapshot()
+
+    def find_similar(self, text):
+        """Return (similarity, posted_text) of the closest earlier tweet above the threshold, or None."""
+        sig = minhash(text)
+        self._loaded.wait()
+        with self._lock:
+            candidates = set()
+            for band, table in enumerate(self._bands):
+                candidates.update(table.get(sig[band * ROWS:(band + 1) * ROWS], ()))
+            best = None
+            for doc in candidates:
+                score = similarity(sig, self._signatures[doc])
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, self._texts[doc])
+            return best
+
+    def is_duplicate(self, text):
+        match = self.find_similar(text)
+        if match:
+            logger.info(f"[Dedup] Candidate is {match[0]:.0%} similar to: {match[1][:60]}")
+        return match is not None
+
+    def _insert(self, sig, text):
+        doc = len(self._signatures)
+        self._signatures.append(sig)
+        self._texts.append(text)
+        for band, table in enumerate(self._bands):
+            table.setdefault(sig[band * ROWS:(band + 1) * ROWS], []).append(doc)
+
+    def _load(self):
+        try:
+            with self._lock:
+                self._load_snapshot()
+                self._load_new()
+                if len(self._signatures) - self._snapshot_len >= SNAPSHOT_EVERY:
+                    self._save_snapshot()
+        except Exception as e:
+            logger.error(f"[Dedup] Could not load {self.path}: {e}")
+        finally:
+            self._loaded.set()
+
+    def _load_new(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                f.seek(self._offset)
+                loaded = 0
+                while True:
+                    line = f.readline()
+                    if not line.endswith('\n'):
+                        break  # EOF or a line still being written
+                    self._offset = f.tell()
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('v') == INDEX_VERSION:
+                        self._insert(_decode(entry['sig']), entry.get('text', ''))
+                        loaded += 1
+            if loaded:
+                logger.info(f"[Dedup] Loaded {loaded} tweet signature(s) from {self.path}")
+        except FileNotFoundError:
+            pass
+
+    def _load_snapshot(self):
+        try:
+            with open(self._snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('v') != INDEX_VERSION or snapshot.get('num_perm') != NUM_PERM:
+                return
+            # The snapshot only counts if the index file still holds the lines it covers
+            offset, tail = snapshot['offset'], snapshot['tail']
+            with open(self.path, 'rb') as f:
+                f.seek(offset - len(tail))
+                matches = f.read(len(tail)) == tail
+            if not matches:
+                logger.warning(f"[Dedup] {self._snapshot_path} does not match {self.path}, reloading the index.")
+                os.remove(self._snapshot_path)
+                return
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"[Dedup] Could not read {self._snapshot_path}: {e}")
+            return
+        values = array.array('Q')
+        values.frombytes(snapshot['sigs'])
+        for i, text in enumerate(snapshot['texts']):
+            self._insert(tuple(values[i * NUM_PERM:(i + 1) * NUM_PERM]), text)
+        self._offset = offset
+        self._snapshot_len = len(self._signatures)
+
+    def _save_snapshot(self):
+        values = array.array('Q')
+        for sig in self._signatures:
+            values.extend(sig)
+        tmp_path = self._snapshot_path + '.tmp'
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(max(0, self._offset - 256))
+                tail = f.read(self._offset - f.tell())
+            snapshot = {
+                'v': INDEX_VERSION, 'num_perm': NUM_PERM, 'offset': self._offset, 'tail': tail,
+                'sigs': values.tobytes(), 'texts': self._texts,
+            }
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._snapshot_path)
+            self._snapshot_len = len(self._signatures)
+        except Exception as e:
+            logger.warning(f"[Dedup] Could not write {self._snapshot_path}: {e}")
+
+
+def _encode(sig):
+    return ''.join(f'{v:016x}' for v in sig)
+
+
+def _decode(data):
+    return tuple(int(data[i:i + 16], 16) for i in range(0, len(data), 16))
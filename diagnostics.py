@@ -0,0 +1,137 @@
+import os
+import gzip
+import json
+import time
+import queue
+import uuid
+import logging
+import threading
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# off: never capture, failure: only when a post finally fails, always: also at every retry
+DIAGNOSTICS_MODE = os.getenv('DIAGNOSTICS', 'failure').lower()
+# screenshot: viewport JPEG, dom: gzip-compressed page HTML
+DIAGNOSTICS_FORMAT = os.getenv('DIAGNOSTICS_FORMAT', 'screenshot').lower()
+DIAGNOSTICS_DIR = os.path.abspath(os.getenv('DIAGNOSTICS_DIR', 'diagnostics'))
+DIAGNOSTICS_MAX_MB = float(os.getenv('DIAGNOSTICS_MAX_MB', '50'))
+JPEG_QUALITY = 60
+WRITE_QUEUE_SIZE = 16  # pending captures; further captures are dropped, never waited for
+
+
+def new_trace_id():
+    """Short id linking a post's log lines, errors and diagnostics captures."""
+    return uuid.uuid4().hex[:12]
+
+
+class Diagnostics:
+    """
+    Captures the page state while posting and writes it off the browser thread.
+
+    The capture itself (a viewport JPEG or the page HTML) must run on the
+    browser thread, but compressing and writing it does not: captures are handed to a
+    writer thread that stores `<time>_<trace_id>_<stage>.<ext>` plus a JSON
+    sidecar in DIAGNOSTICS_DIR and deletes the oldest files once the
+    directory exceeds DIAGNOSTICS_MAX_MB.
+    """
+
+    def __init__(self, mode=DIAGNOSTICS_MODE, fmt=DIAGNOSTICS_FORMAT,
+                 directory=DIAGNOSTICS_DIR, max_mb=DIAGNOSTICS_MAX_MB):
+        self.mode = mode
+        self.format = fmt
+        self.directory = directory
+        self.max_bytes = int(max_mb * 2**20)
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enabled(self, failure):
+        return self.mode == 'always' or (self.mode == 'failure' and failure)
+
+    def capture(self, page, trace_id, stage, reason='', failure=False):
+        """
+        Capture `page` if the mode asks for it. Returns the capture's file name
+        (to mention in errors) or None. Never raises.
+        """
+        if not self.enabled(failure):
+            return None
+        try:
+            with metrics.span('diagnostics_capture'):
+                if self.format == 'dom':
+                    data, ext = page.content().encode('utf-8'), 'html.gz'
+                else:
+                    data, ext = page.screenshot(type='jpeg', quality=JPEG_QUALITY), 'jpg'
+            url = page.url
+        except Exception as e:
+            logger.debug(f"[Diagnostics] Capture failed: {e}")
+            return None
+        base = f"{time.strftime('%Y%m%d-%H%M%S')}_{trace_id}_{stage}"
+        meta = {
+            'trace_id': trace_id,
+            'stage': stage,
+            'reason': reason,
+            'url': url,
+            'failure': failure,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self._start()
+        try:
+            self._queue.put_nowait((base, ext, data, meta))
+        except queue.Full:
+            metrics.inc('diagnostics_dropped')
+            return None
+        metrics.inc('diagnostics_captures')
+        return f'{base}.{ext}'
+
+    def close(self):
+        """Write out pending captures and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(10)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name='diagnostics-writer', daemon=True)
+                self._thread.start()
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            base, ext, data, meta = item
+            try:
+                self._write(base, ext, data, meta)
+            except Exception as e:
+                logger.warning(f"[Diagnostics] Could not write {base}.{ext}: {e}")
+
+    def _write(self, base, ext, data, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        if ext.endswith('.gz'):
+            data = gzip.compress(data)
+        with open(os.path.join(self.directory, f'{base}.{ext}'), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(self.directory, f'{base}.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest captures until the directory fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        total = sum(size for _, _, size in entries)
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
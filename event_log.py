@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Per-module overrides, e.g. "twitter_web=DEBUG,gemini=WARNING"; changeable at runtime via set_levels()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # console: 'text' or 'json'
+LOG_FILE = os.getenv('LOG_FILE', os.path.join('logs', 'koiibot.jsonl'))  # JSON lines; empty disables
+LOG_MAX_MB = float(os.getenv('LOG_MAX_MB', '10'))  # size-based rotation...
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')  # ...or time-based, e.g. 'midnight' or 'H'
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+LOG_QUEUE_SIZE = 10000  # pending records; further records are dropped, never waited for
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Structured fields an event may carry, passed as `extra=` or set by log_context()
+EVENT_FIELDS = ('post_id', 'stage', 'duration_ms', 'attempt')
+
+_context = contextvars.ContextVar('log_context', default={})
+_listener = None
+_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (e.g. post_id) to every record logged by this thread inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps log_context() fields onto records in the logging thread, before they are queued."""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any event fields."""
+
+    def format(self, record):
+        event = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for field in EVENT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                event[field] = value
+        if record.exc_info:
+            event['exc'] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: when the queue is full the record is counted and dropped."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from metrics import metrics
+            metrics.inc('log_records_dropped')
+
+
+def _file_handler(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS, encoding='utf-8')
+    return RotatingFileHandler(path, maxBytes=int(LOG_MAX_MB * 2**20), backupCount=LOG_BACKUPS, encoding='utf-8')
+
+
+def configure_logging(level=LOG_LEVEL, levels=LOG_LEVELS, log_file=LOG_FILE, console_format=LOG_FORMAT):
+    """
+    Route all logging through a queue: callers only enqueue the record, and a
+    background listener formats it and writes it to the console and to the
+    rotating JSON-lines file. Safe to call more than once; later calls replace
+    the handlers.
+    """
+    global _listener
+    with _lock:
+        _stop_listener()
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter() if console_format == 'json' else logging.Formatter(TEXT_FORMAT))
+        handlers = [console]
+        if log_file:
+            try:
+                file_handler = _file_handler(log_file)
+                file_handler.setFormatter(JsonFormatter())
+                handlers.append(file_handler)
+            except OSError as e:
+                logging.getLogger(__name__).error(f"[Logging] Could not open {log_file}: {e}")
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = _DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(_ContextFilter())
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        _listener = QueueListener(log_queue, *handlers)
+        _listener.start()
+    set_levels(levels)
+
+
+def configure_child_logging(log_queue, levels=LOG_LEVELS):
+    """
+    In a worker process: send every record, with its log_context() fields,
+    to the parent through `log_queue`, where forward_records() writes it to
+    the parent's console and log file. `levels` is usually the parent's levels().
+    """
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    set_levels(levels)
+
+
+def forward_records(log_queue):
+    """
+    In the parent: replay the records a worker sends through `log_queue` into
+    this process's logging, under the current levels. Runs on a daemon
+    thread until None is put on the queue.
+    """
+    def run():
+        while True:
+            try:
+                record = log_queue.get()
+            except (EOFError, OSError):
+                break
+            if record is None:
+                break
+            log = logging.getLogger(record.name)
+            if log.isEnabledFor(record.levelno):
+                log.handle(record)
+
+    thread = threading.Thread(target=run, name='log-forwarder', daemon=True)
+    thread.start()
+    return thread
+
+
+def set_levels(spec):
+    """
+    Apply per-module levels from "module=LEVEL,..." (a dict also works).
+    "module=" or "module=NOTSET" goes back to inheriting the root level.
+    Returns the resulting levels(); raises ValueError for an unknown level.
+    """
+    if isinstance(spec, str):
+        spec = dict(item.split('=', 1) for item in spec.split(',') if '=' in item)
+    for name, level in spec.items():
+        name = name.strip()
+        level = ((level or '').strip() or 'NOTSET').upper()
+        if name in ('', 'root'):
+            logging.getLogger().setLevel(LOG_LEVEL if level == 'NOTSET' else level)
+        else:
+            logging.getLogger(name).setLevel(level)
+    return levels()
+
+
+def levels():
+    """The root level and every explicitly set module level."""
+    result = {'root': logging.getLevelName(logging.getLogger().level)}
+    for name, log in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(log, logging.Logger) and log.level != logging.NOTSET:
+            result[name] = logging.getLevelName(log.level)
+    return result
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer."""
+    with _lock:
+        _stop_listener()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
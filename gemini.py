@@ -3,61 +3,357 @@ import google.generativeai as genai
 from dotenv import load_dotenv
 import logging
 import re
+import json
+import time
+from metrics import metrics
+from tweet_length import MAX_WEIGHTED_LENGTH, weighted_length, truncate
+from dedup import DUPLICATE_THRESHOLD, minhash, similarity
+from resilience import CircuitBreaker, ResilientCaller, CircuitOpenError, is_quota_error, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+TWEET_PROMPT = (
+    "Write a unique and self-contained tweet in English about the KOII ecosystem, focusing on features like decentralized tasks, creator rewards, data ownership, or the role of node operators. "
+    "The tweet must explicitly mention $KOII in the text. "
+    "Do not include any links, URLs, placeholder text, or references to other tweets. "
+    "Do not mention NFTs, metaverse, or unrelated technologies. "
+    "Each tweet must be factually accurate and standalone. "
+    "Vary sentence structure and starting words to avoid repetition across outputs. "
+    "Maximum length is 280 characters."
+)
+
+BATCH_PROMPT = (
+    "Write {n} different tweets in English about the KOII ecosystem, each focusing on features like decentralized tasks, creator rewards, data ownership, or the role of node operators. "
+    "Every tweet must explicitly mention $KOII in the text. "
+    "Do not include any links, URLs, brackets, placeholder text, or references to other tweets. "
+    "Do not mention NFTs, metaverse, or unrelated technologies. "
+    "Each tweet must be factually accurate and standalone, and the tweets must differ in topic, sentence structure and starting words. "
+    "Maximum length of each tweet is 280 characters. "
+    "Respond with only a JSON array of {n} strings, without markdown formatting."
+)
+
+THREAD_PROMPT = (
+    "Write a thread of {n} tweets in English about the KOII ecosystem that reads as one coherent story, for example explaining decentralized tasks, creator rewards, data ownership, or the role of node operators step by step. "
+    "The first tweet must hook the reader and explicitly mention $KOII; each following tweet continues from the previous one and may refer back to it. "
+    "Do not include any links, URLs, brackets, numbering like 1/{n}, placeholder text, or references to other tweets. "
+    "Do not mention NFTs, metaverse, or unrelated technologies. "
+    "Everything must be factually accurate. "
+    "Maximum length of each tweet is 280 characters. "
+    "Respond with only a JSON array of {n} strings in thread order, without markdown formatting."
+)
+
+MAX_TWEET_LENGTH = MAX_WEIGHTED_LENGTH  # as X weighs it, see tweet_length.py
+# Stream single tweets and abort as soon as the partial text is unusable
+GEMINI_STREAM = os.getenv('GEMINI_STREAM', 'true').lower() == 'true'
+GEMINI_CALL_DEADLINE = float(os.getenv('GEMINI_CALL_DEADLINE', '30'))  # seconds per request
+GEMINI_HEDGE = os.getenv('GEMINI_HEDGE', 'true').lower() == 'true'
+URL_PATTERN = re.compile(r'https?://|www\.|\b[\w-]+\.(?:com|io|network|org|net|xyz|ai|app)\b', re.IGNORECASE)
+BRACKET_PATTERN = re.compile(r'[\[\]\(\)\{\}<>]')
+
+def validate_tweet(tweet, require_ticker=True):
+    """
+    Return None if the tweet can be posted as-is, otherwise a short rejection reason.
+    With require_ticker=False a tweet without $KOII passes (follow-up thread parts).
+    """
+    if not tweet or not tweet.strip():
+        return 'empty'
+    if weighted_length(tweet) > MAX_TWEET_LENGTH:
+        return 'too_long'
+    if require_ticker and '$KOII' not in tweet:
+        return 'missing_ticker'
+    if URL_PATTERN.search(tweet):
+        return 'url'
+    if BRACKET_PATTERN.search(tweet):
+        return 'brackets'
+    return None
+
+def validate_thread(parts, n):
+    """
+    Return None if parts is a postable thread of n tweets, otherwise a rejection
+    reason. Every part must pass validate_tweet; only the opening one has to
+    mention $KOII.
+
+    >>> validate_thread(["Hook about $KOII tasks.", "Read more at https://evil.example.com (link)", "Third [placeholder]"], 3)
+    'url'
+    >>> validate_thread(["Hook about $KOII tasks.", "Nodes earn rewards.", "Run one today."], 3) is None
+    True
+    """
+    if len(parts) != n:
+        return 'part_count'
+    for i, part in enumerate(parts):
+        reason = validate_tweet(part, require_ticker=i == 0)
+        if reason:
+            return reason
+    return None
+
+def early_reject_reason(partial):
+    """
+    Checks that can already fail on a partial, still-streaming response.
+    Returns a rejection reason or None.
+    """
+    if weighted_length(partial.strip()) > MAX_TWEET_LENGTH:
+        return 'too_long'
+    if URL_PATTERN.search(partial):
+        return 'url'
+    if BRACKET_PATTERN.search(partial):
+        return 'brackets'
+    return None
+
+def score_tweet(tweet):
+    """Rank valid candidates: prefer substantial tweets with few hashtags."""
+    score = min(len(tweet), 240) / 240
+    score -= 0.1 * max(0, tweet.count('#') - 2)
+    score -= 0.1 * max(0, tweet.count('$KOII') - 2)
+    return score
+
+def _parse_candidates(text):
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.strip('`')
+        if text.lower().startswith('json'):
+            text = text[4:]
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        raise ValueError("No JSON array in response")
+    data = json.loads(text[start:end + 1])
+    return [c.strip() for c in data if isinstance(c, str)]
+
+def _cancel_stream(response):
+    # Stop the server from generating tokens we are going to throw away. The SDK
+    # exposes no public cancel, so this reaches for the underlying gRPC call.
+    iterator = getattr(response, '_iterator', None)
+    cancel = getattr(iterator, 'cancel', None)
+    if callable(cancel):
+        try:
+            cancel()
+        except Exception:
+            pass
 
 class GeminiClient:
-    def __init__(self):
+    def __init__(self, dedup_index=None):
+        """
+        Args:
+            dedup_index: Optional TweetIndex; candidates too similar to a posted
+                tweet are rejected and regenerated
+        """
         load_dotenv()
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.dedup_index = dedup_index
+        # Single and batch requests have different latency profiles (and so
+        # different hedge points) but fail together, so they share one breaker
+        breaker = CircuitBreaker('gemini')
+        self.caller = ResilientCaller('gemini', GEMINI_CALL_DEADLINE, breaker=breaker, hedge=GEMINI_HEDGE)
+        self.batch_caller = ResilientCaller('gemini_batch', GEMINI_CALL_DEADLINE, breaker=breaker, hedge=GEMINI_HEDGE)
 
-    def generate_tweet(self) -> str:
+    def _generate(self, prompt, **kwargs):
+        # google-generativeai 0.3.x has no per-request timeout; the callers'
+        # GEMINI_CALL_DEADLINE abandons requests that run too long
+        return self.model.generate_content(prompt, **kwargs)
+
+    def _backoff(self, attempt, error):
+        """Sleep before the next attempt if the last one hit the quota."""
+        if error is not None and is_quota_error(error):
+            delay = backoff_delay(attempt)
+            metrics.inc('gemini_quota_backoffs')
+            logger.warning(f"[Gemini] Quota exceeded, backing off {delay:.1f}s.")
+            time.sleep(delay)
+
+    def generate_tweet(self, use_fallback=True) -> str:
         """
         Generate a tweet about the KOII project using Gemini AI.
-        Returns a string containing the generated tweet.
+        Returns a string containing the generated tweet. When every attempt fails
+        the fallback tweet is returned, or None if use_fallback is False.
         """
         fallback_tweet = "KOII is revolutionizing digital ownership. Discover more at https://www.koii.network/ #KOII"
+        error = None
         for attempt in range(3):
+            if attempt:
+                metrics.inc('gemini_retries')
+                self._backoff(attempt - 1, error)
+            error = None
             try:
-                prompt = (
-    			"Write a unique and self-contained tweet in English about the KOII ecosystem, focusing on features like decentralized tasks, creator rewards, data ownership, or the role of node operators. "
-    			"The tweet must explicitly mention $KOII in the text. "
-    			"Do not include any links, URLs, placeholder text, or references to other tweets. "
-    			"Do not mention NFTs, metaverse, or unrelated technologies. "
-    			"Each tweet must be factually accurate and standalone. "
-    			"Vary sentence structure and starting words to avoid repetition across outputs. "
-    			"Maximum length is 280 characters."
-                )
-                response = self.model.generate_content(prompt)
-                tweet = response.text.strip() if response.text else ''
-                # Remove any bracketed or parenthetical text (e.g., [ ... ] or ( ... ))
-                tweet = re.sub(r'\[.*?\]', '', tweet)
-                tweet = re.sub(r'\(.*?\)', '', tweet)
-                tweet = tweet.strip()
-                # Try to avoid abrupt cut-off by trimming to last full sentence if too long
-                if len(tweet) > 280:
-                    logging.warning(f"[Gemini] Tweet too long ({len(tweet)} chars), trimming to 280.")
-                    trimmed = tweet[:280]
-                    if '.' in trimmed:
-                        tweet = trimmed[:trimmed.rfind('.')+1].strip()
-                    else:
-                        tweet = trimmed.strip()
+                if GEMINI_STREAM:
+                    # An aborted stream is short by design; keep it out of the hedge latency stats
+                    tweet, reason = self.caller.call(self._stream_tweet, TWEET_PROMPT,
+                                                     aborted=lambda result: result[1] is not None)
+                    if reason:
+                        logger.warning(f"[Gemini] Aborted streamed tweet ({reason}) on attempt {attempt+1}, retrying.",
+                                       extra={'stage': 'gemini_tweet', 'attempt': attempt + 1})
+                        continue
+                else:
+                    tweet = self.caller.call(self._generate_tweet_blocking, TWEET_PROMPT)
                 if not tweet:
-                    logging.error(f"[Gemini] Empty response on attempt {attempt+1}.")
+                    logger.error(f"[Gemini] Empty response on attempt {attempt+1}.",
+                                 extra={'stage': 'gemini_tweet', 'attempt': attempt + 1})
+                    continue
+                if self.dedup_index and self.dedup_index.is_duplicate(tweet):
+                    logger.warning(f"[Gemini] Near-duplicate of a posted tweet on attempt {attempt+1}, regenerating.",
+                                   extra={'stage': 'gemini_tweet', 'attempt': attempt + 1})
                     continue
                 return tweet
+            except CircuitOpenError:
+                logger.error("[Gemini] Circuit breaker is open, skipping generation.")
+                break
             except Exception as e:
-                logging.error(f"[Gemini] Error generating tweet (attempt {attempt+1}): {str(e)}")
-        logging.error("[Gemini] All attempts failed, using fallback tweet.")
+                error = e
+                logger.error(f"[Gemini] Error generating tweet (attempt {attempt+1}): {str(e)}",
+                             extra={'stage': 'gemini_tweet', 'attempt': attempt + 1})
+        if not use_fallback:
+            logger.error("[Gemini] All attempts failed.")
+            return None
+        logger.error("[Gemini] All attempts failed, using fallback tweet.")
+        metrics.inc('gemini_fallbacks')
         return fallback_tweet
 
+    def _generate_tweet_blocking(self, prompt):
+        with metrics.span('gemini_attempt'):
+            response = self._generate(prompt)
+        tweet = response.text.strip() if response.text else ''
+        # Remove any bracketed or parenthetical text (e.g., [ ... ] or ( ... ))
+        tweet = re.sub(r'\[.*?\]', '', tweet)
+        tweet = re.sub(r'\(.*?\)', '', tweet)
+        tweet = tweet.strip()
+        # Avoid an abrupt cut-off by trimming at a sentence or word boundary
+        length = weighted_length(tweet)
+        if length > MAX_TWEET_LENGTH:
+            logger.warning(f"[Gemini] Tweet too long ({length} weighted chars), trimming to {MAX_TWEET_LENGTH}.")
+            tweet = truncate(tweet, MAX_TWEET_LENGTH)
+        return tweet
+
+    def _stream_tweet(self, prompt):
+        """
+        Generate one tweet with stream=True, validating the text as it arrives.
+        Returns (tweet, None), or (None, reason) when the stream was abandoned
+        because the partial text already fails validation.
+        Records time-to-first-token and total generation time.
+        """
+        start = time.perf_counter()
+        first_token_at = None
+        text = ''
+        with metrics.span('gemini_attempt'):
+            response = self._generate(prompt, stream=True)
+            for chunk in response:
+                try:
+                    piece = chunk.text
+                except ValueError:
+                    continue  # chunk without text parts (e.g. safety metadata)
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.observe('gemini_ttft', (first_token_at - start) * 1000)
+                text += piece
+                reason = early_reject_reason(text)
+                if reason:
+                    metrics.inc(f'gemini_stream_aborts_{reason}')
+                    _cancel_stream(response)
+                    return None, reason
+        metrics.observe('gemini_generation', (time.perf_counter() - start) * 1000)
+        tweet = text.strip()
+        reason = validate_tweet(tweet) if tweet else None
+        if reason:
+            metrics.inc(f'gemini_rejected_{reason}')
+            return None, reason
+        return tweet, None
+
+    def _generate_batch(self, n, prompt=BATCH_PROMPT):
+        with metrics.span('gemini_batch_attempt'):
+            return self._generate(prompt.format(n=n))
+
+    def generate_tweets(self, n: int) -> list:
+        """
+        Generate up to n tweets with a single structured (JSON) request per attempt.
+        Candidates failing validate_tweet are dropped, and so are those too similar
+        to a posted tweet or to an earlier survivor; the survivors are returned
+        best first according to score_tweet. May return fewer than n tweets.
+        """
+        survivors = []
+        signatures = []
+        threshold = self.dedup_index.threshold if self.dedup_index else DUPLICATE_THRESHOLD
+        error = None
+        for attempt in range(3):
+            if attempt:
+                metrics.inc('gemini_retries')
+                self._backoff(attempt - 1, error)
+            error = None
+            try:
+                response = self.batch_caller.call(self._generate_batch, n)
+                candidates = _parse_candidates(response.text or '')
+            except CircuitOpenError:
+                logger.error("[Gemini] Circuit breaker is open, skipping batch generation.")
+                break
+            except Exception as e:
+                error = e
+                logger.error(f"[Gemini] Error generating batch (attempt {attempt+1}): {str(e)}",
+                             extra={'stage': 'gemini_batch', 'attempt': attempt + 1})
+                continue
+            for candidate in candidates:
+                reason = validate_tweet(candidate)
+                if not reason and self.dedup_index and self.dedup_index.is_duplicate(candidate):
+                    reason = 'duplicate'
+                if not reason:
+                    sig = minhash(candidate)
+                    if any(similarity(sig, other) >= threshold for other in signatures):
+                        reason = 'similar_in_batch'
+                if reason:
+                    metrics.inc(f'gemini_rejected_{reason}')
+                    logger.info(f"[Gemini] Rejected candidate ({reason}): {candidate[:60]}")
+                else:
+                    survivors.append(candidate)
+                    signatures.append(sig)
+            if len(survivors) >= n:
+                break
+        survivors.sort(key=score_tweet, reverse=True)
+        return survivors[:n]
+
+    def generate_thread(self, n: int) -> list:
+        """
+        Generate a coherent thread of n tweets in one structured (JSON) request per
+        attempt. Every part must pass validate_tweet, except that only the first
+        needs to mention $KOII, and no part may duplicate a posted tweet.
+        Returns the parts in order, or [] when every attempt fails.
+        """
+        error = None
+        for attempt in range(3):
+            if attempt:
+                metrics.inc('gemini_retries')
+                self._backoff(attempt - 1, error)
+            error = None
+            try:
+                response = self.batch_caller.call(self._generate_batch, n, THREAD_PROMPT)
+                parts = _parse_candidates(response.text or '')
+            except CircuitOpenError:
+                logger.error("[Gemini] Circuit breaker is open, skipping thread generation.")
+                break
+            except Exception as e:
+                error = e
+                logger.error(f"[Gemini] Error generating thread (attempt {attempt+1}): {str(e)}",
+                             extra={'stage': 'gemini_thread', 'attempt': attempt + 1})
+                continue
+            reason = self._thread_rejection(parts, n)
+            if not reason:
+                return parts
+            metrics.inc(f'gemini_rejected_{reason}')
+            logger.warning(f"[Gemini] Rejected thread ({reason}) on attempt {attempt+1}, regenerating.",
+                           extra={'stage': 'gemini_thread', 'attempt': attempt + 1})
+        return []
+
+    def _thread_rejection(self, parts, n):
+        """Reason to reject a generated thread, or None if it can be posted."""
+        reason = validate_thread(parts, n)
+        if reason:
+            return reason
+        if self.dedup_index and any(self.dedup_index.is_duplicate(part) for part in parts):
+            return 'duplicate'
+        return None
+
 if __name__ == "__main__":
     client = GeminiClient()
     try:
         tweet = client.generate_tweet()
         print(f"Generated tweet: {tweet}")
-        print(f"Tweet length: {len(tweet)} characters")
+        print(f"Tweet length: {weighted_length(tweet)} weighted characters")
     except Exception as e:
         print(f"Error: {str(e)}") 
\ No newline at end of file
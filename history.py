@@ -0,0 +1,134 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = os.path.abspath('tweet_history.db')
+FLUSH_BATCH_SIZE = 20
+FLUSH_INTERVAL = 2.0  # seconds a write may wait before it is committed
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    posted_at TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tweet_id TEXT,
+    latency_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_posted_at ON tweets(posted_at);
+"""
+
+
+class TweetHistory:
+    """
+    SQLite-backed record of every posted tweet.
+
+    The database runs in WAL mode so the dashboard can read while the bot
+    writes. Writes are queued and committed in batches (at most
+    FLUSH_BATCH_SIZE rows or FLUSH_INTERVAL seconds later); every read
+    flushes first so callers always see their own writes.
+    """
+
+    def __init__(self, path=HISTORY_PATH, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_timer = None
+
+    def add(self, timestamp, text, tweet_id=None, latency_ms=None):
+        """Queue a posted tweet for writing."""
+        with self._lock:
+            self._pending.append((timestamp, text, tweet_id, latency_ms))
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """Commit all queued writes."""
+        with self._lock:
+            self._flush_locked()
+
+    def recent(self, limit=50, before_id=None, after_id=None):
+        """
+        Return up to `limit` tweets, newest first, as dicts with id, timestamp
+        and text. Pass the smallest id of the previous page as before_id to
+        page further back, or the largest id already seen as after_id to get
+        only newer tweets.
+        """
+        query = 'SELECT id, posted_at, text FROM tweets'
+        conditions = []
+        params = []
+        if before_id is not None:
+            conditions.append('id < ?')
+            params.append(before_id)
+        if after_id is not None:
+            conditions.append('id > ?')
+            params.append(after_id)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        rows = self._read(query, params)
+        return [{'id': row[0], 'timestamp': row[1], 'text': row[2]} for row in rows]
+
+    def search(self, text, limit=50):
+        """Return up to `limit` tweets containing `text`, newest first."""
+        rows = self._read(
+            'SELECT id, posted_at, text FROM tweets WHERE text LIKE ? ORDER BY id DESC LIMIT ?',
+            (f'%{text}%', limit)
+        )
+        return [{'id': row[0], 'timestamp': row[1], 'text': row[2]} for row in rows]
+
+    def count_total(self):
+        return self._read('SELECT COUNT(*) FROM tweets')[0][0]
+
+    def count_since(self, timestamp):
+        return self._read('SELECT COUNT(*) FROM tweets WHERE posted_at >= ?', (timestamp,))[0][0]
+
+    def count_today(self):
+        return self.count_since(time.strftime('%Y-%m-%d 00:00:00'))
+
+    def last_posted_at(self):
+        """Timestamp string of the most recent tweet, or None."""
+        rows = self._read('SELECT MAX(posted_at) FROM tweets')
+        return rows[0][0]
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def _read(self, query, params=()):
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(query, params).fetchall()
+
+    def _flush_locked(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO tweets (posted_at, text, tweet_id, latency_ms) VALUES (?, ?, ?, ?)',
+                    self._pending
+                )
+            self._pending = []
+        except sqlite3.Error as e:
+            logger.error(f"[History] Could not write {len(self._pending)} tweet(s): {e}")
@@ -1,18 +1,27 @@
 import logging
-from gemini import GeminiClient
-from scheduler import TweetScheduler
-from dashboard import Dashboard
-from twitter_web import TwitterWebClient
+from tweet_buffer import TweetBuffer
+from dedup import TweetIndex
+from history import TweetHistory
+from metrics import metrics, start_metrics_server
+from event_log import configure_logging, log_context
+from diagnostics import new_trace_id
+from accounts import load_accounts
+from tweet_length import MAX_WEIGHTED_LENGTH, weighted_length, truncate
+from browser_worker import USE_BROWSER_WORKER
 import threading
 import datetime
+import argparse
+import signal
+import sys
+import os
+# gemini (google.generativeai), twitter_web/transport (playwright), dashboard (tkinter)
+# and scheduler (apscheduler) are imported where they are first used, keeping startup fast
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+METRICS_DUMP_PATH = os.path.abspath('metrics.json')
+THREAD_PARTS = int(os.getenv('THREAD_PARTS', '4'))  # tweets in a generated thread
+
 def format_timestamp(dt):
     if isinstance(dt, str):
         return dt
@@ -22,39 +31,233 @@ dashboard = None  # Global reference for dashboard
 
 def log_tweet_to_dashboard(dashboard, tweet_text, timestamp):
     if dashboard:
-        dashboard.queue.put(("tweet_success", {"timestamp": timestamp, "text": tweet_text}))
-        print(f"[INFO] Tweet added to dashboard at {timestamp}")
+        dashboard.post_event("tweet_success", {"timestamp": timestamp, "text": tweet_text})
+        logger.debug(f"[Dashboard] Tweet queued for the dashboard at {timestamp}")
 
 def handle_successful_post(dashboard, result):
     log_tweet_to_dashboard(dashboard, result['text'], result['timestamp'])
 
 class KoiiBot:
-    def __init__(self, dashboard=None):
-        self.gemini_client = GeminiClient()
-        self.twitter_web_client = TwitterWebClient()
-        self.scheduler = TweetScheduler(self.post_tweet)
+    def __init__(self, dashboard=None, history=None, gemini_client=None):
+        self.history = history or TweetHistory()
+        self.tweet_index = TweetIndex()
+        # Heavy clients are built on first use, see the properties below
+        self._gemini_client = gemini_client
+        self._twitter_web_client = None
+        self._transport = None
+        self._clients_lock = threading.Lock()
+        self._transport_lock = threading.Lock()  # separate: building transports may build the web client
+        self.tweet_buffer = TweetBuffer(lambda n: self.gemini_client.generate_tweets(n))
+        self.accounts = load_accounts()
+        self.engine_runner = None  # started on the first multi-account slot
+        self.scheduler = None  # created by start()
         self.dashboard = dashboard
         self.running = False
-    
+
+    @property
+    def gemini_client(self):
+        with self._clients_lock:
+            if self._gemini_client is None:
+                from gemini import GeminiClient
+                self._gemini_client = GeminiClient(dedup_index=self.tweet_index)
+            return self._gemini_client
+
+    @property
+    def twitter_web_client(self):
+        with self._clients_lock:
+            if self._twitter_web_client is None:
+                # BROWSER_WORKER=true keeps Chromium in a recycled child process
+                if USE_BROWSER_WORKER:
+                    from browser_worker import BrowserWorker
+                    self._twitter_web_client = BrowserWorker()
+                else:
+                    from twitter_web import TwitterWebClient
+                    self._twitter_web_client = TwitterWebClient()
+            return self._twitter_web_client
+
+    @property
+    def transport(self):
+        if self._transport is None:
+            from transport import TransportRouter, build_transports
+            # POST_TRANSPORTS picks between the X API and the browser per post; the
+            # browser client is only built when the browser transport is configured
+            with self._transport_lock:
+                if self._transport is None:
+                    self._transport = TransportRouter(build_transports(lambda: self.twitter_web_client))
+        return self._transport
+
+    def status(self):
+        """Snapshot of the bot's state for the /status endpoint."""
+        next_run = next_generation = None
+        last_runs = {}
+        if self.scheduler is not None:
+            from scheduler import GENERATE_JOB_ID
+            next_run = self.scheduler.next_run_time()
+            next_generation = self.scheduler.next_run_time(GENERATE_JOB_ID)
+            last_runs = self.scheduler.last_runs()
+        return {
+            'running': self.running,
+            'next_post_at': next_run.isoformat() if next_run else None,
+            'next_generation_at': next_generation.isoformat() if next_generation else None,
+            'last_runs': last_runs,
+            'last_posted_at': self.history.last_posted_at(),
+            'posts_today': self.history.count_today(),
+            'posts_total': self.history.count_total(),
+            'buffered_tweets': len(self.tweet_buffer),
+            'accounts': len(self.accounts),
+            'clients_loaded': {
+                'gemini': self._gemini_client is not None,
+                'browser': self._twitter_web_client is not None,
+                'transport': self._transport is not None,
+            },
+        }
+
     def post_tweet(self, tweet_text=None):
-        try:
-            if tweet_text is None:
+        # One id for the whole pipeline: generation, transport and the browser's captures
+        trace_id = new_trace_id()
+        with log_context(post_id=trace_id):
+            try:
+                with metrics.span('post_total'):
+                    return self._post_tweet(tweet_text, trace_id)
+            except Exception as e:
+                metrics.inc('posts_failed')
+                logger.error(f"Error posting tweet: {str(e)}")
+                if self.dashboard:
+                    self.dashboard.set_status("Inactive")
+                raise
+
+    def _post_tweet(self, tweet_text, trace_id):
+        if tweet_text is None:
+            tweet_text = self._pop_buffered()
+        if tweet_text is None:
+            logger.info("Tweet buffer empty, generating tweet live.")
+            metrics.inc('buffer_misses')
+            with metrics.span('generate_live'):
                 tweet_text = self.gemini_client.generate_tweet()
-            logger.info(f"Generated tweet: {tweet_text}")
-            result = self.twitter_web_client.post_tweet_web(tweet_text)
-            logger.info(f"Tweet posted via web automation.")
-            handle_successful_post(self.dashboard, result)
-            return {'timestamp': result['timestamp'], 'text': result['text']}
-        except Exception as e:
-            logger.error(f"Error posting tweet: {str(e)}")
-            if self.dashboard:
-                self.dashboard.set_status("Inactive")
-            raise
+        logger.info(f"Generated tweet: {tweet_text}")
+        # X would refuse an overweight tweet only after the composer retries time out
+        length = weighted_length(tweet_text)
+        if length > MAX_WEIGHTED_LENGTH:
+            logger.warning(f"Tweet weighs {length} characters, truncating to {MAX_WEIGHTED_LENGTH}.")
+            tweet_text = truncate(tweet_text)
+        with metrics.span('post_transport'):
+            result = self.transport.post(tweet_text, trace_id)
+        self._record_post(result)
+        logger.info(f"Tweet posted via {result.get('transport')} (id={result.get('id')}, confirmed in {result.get('latency_ms')} ms).",
+                    extra={'stage': 'posted', 'duration_ms': result.get('latency_ms')})
+        return {
+            'timestamp': result['timestamp'],
+            'text': result['text'],
+            'id': result.get('id'),
+            'latency_ms': result.get('latency_ms')
+        }
     
+    def _record_post(self, result):
+        """Count a successful post and add it to the index, history and dashboard."""
+        metrics.inc('posts')
+        self.tweet_index.add(result['text'])
+        self.history.add(result['timestamp'], result['text'], result.get('id'), result.get('latency_ms'))
+        handle_successful_post(self.dashboard, result)
+
+    def post_many(self, texts=None, count=None):
+        """
+        Post a burst of tweets from one browser page (default: `count` tweets from
+        the buffer, topped up by a batch generation). Returns per-tweet results;
+        failed ones carry an 'error'.
+        """
+        if texts is None:
+            texts = self._take_texts(count or 1)
+        texts = [truncate(text) for text in texts]
+        with metrics.span('post_many'):
+            results = self.twitter_web_client.post_many(texts)
+        return self._record_bulk(results, 'burst')
+
+    def post_thread(self, texts=None, parts=THREAD_PARTS):
+        """
+        Post a reply chain from one browser page; with no texts Gemini writes a
+        `parts`-tweet thread. Returns per-part results; failed ones carry an 'error'.
+        """
+        if texts is None:
+            with metrics.span('generate_thread'):
+                texts = self.gemini_client.generate_thread(parts)
+            if not texts:
+                raise Exception("Could not generate a thread")
+        texts = [truncate(text) for text in texts]
+        with metrics.span('post_thread'):
+            results = self.twitter_web_client.post_thread(texts)
+        return self._record_bulk(results, 'thread')
+
+    def _record_bulk(self, results, kind):
+        for result in results:
+            if 'error' in result:
+                metrics.inc('posts_failed')
+            else:
+                self._record_post(result)
+        posted = sum('error' not in result for result in results)
+        logger.info(f"Posted {posted}/{len(results)} tweets of the {kind}.")
+        return results
+
+    def _pop_buffered(self):
+        """Next buffered tweet, skipping any too similar to one posted since it was generated."""
+        while True:
+            text = self.tweet_buffer.pop()
+            if text is None or not self.tweet_index.is_duplicate(text):
+                return text
+            metrics.inc('buffer_duplicates_dropped')
+
+    def _take_texts(self, count):
+        """Up to `count` tweets: buffered ones first, then a batch generation."""
+        texts = []
+        while len(texts) < count:
+            text = self._pop_buffered()
+            if text is None:
+                break
+            texts.append(text)
+        if len(texts) < count:
+            metrics.inc('buffer_misses')
+            with metrics.span('generate_live'):
+                texts += self.gemini_client.generate_tweets(count - len(texts))
+        return texts
+
+    def prepare_slot(self):
+        """Generation job: make sure the next slot's tweets are buffered before the hour."""
+        with metrics.span('prepare_slot'):
+            self.tweet_buffer.refill(minimum=max(1, len(self.accounts)))
+
+    def post_scheduled(self):
+        """Scheduler entry point: one account via the browser client, or all of ACCOUNTS_FILE at once."""
+        if self.accounts:
+            return self.post_for_accounts()
+        return self.post_tweet()
+
+    def post_for_accounts(self):
+        """Post one tweet for every configured account concurrently."""
+        texts = self._take_texts(len(self.accounts))
+        tweets = {account.name: text for account, text in zip(self.accounts, texts)}
+        if self.engine_runner is None:
+            from async_engine import AsyncPostingEngine, EngineRunner
+            self.engine_runner = EngineRunner(AsyncPostingEngine(self.accounts))
+        results = {}
+        with metrics.span('post_accounts'):
+            for name, result in self.engine_runner.post_all(tweets).items():
+                if isinstance(result, Exception):
+                    metrics.inc('posts_failed')
+                    logger.error(f"Error posting tweet for {name}: {result}")
+                    continue
+                self._record_post(result)
+                results[name] = result
+        logger.info(f"Posted for {len(results)}/{len(self.accounts)} account(s).")
+        return results
+
     def start(self):
         try:
+            from scheduler import TweetScheduler
+            self.scheduler = TweetScheduler(self.post_scheduled, self.prepare_slot)
             self.scheduler.schedule_tweets()
             self.scheduler.start()
+            self.tweet_buffer.start()
+            # Replaces the unconditional startup tweet: only a missed, unposted slot is posted now
+            self.scheduler.catch_up(self.history.last_posted_at())
             self.running = True
             if self.dashboard:
                 self.dashboard.set_status("Active")
@@ -65,29 +268,33 @@ class KoiiBot:
                 self.dashboard.set_status("Inactive")
     
     def stop(self):
-        self.scheduler.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self.tweet_buffer.stop()
+        if self._transport is not None:
+            self._transport.close()
+        elif self._twitter_web_client is not None:
+            self._twitter_web_client.close()
+        if self.engine_runner is not None:
+            self.engine_runner.close()
+        self.history.flush()
+        metrics.dump_json(METRICS_DUMP_PATH)
         self.running = False
         if self.dashboard:
             self.dashboard.set_status("Inactive")
         logger.info("KoiiBot stopped")
 
-def run_initial_tweet(bot, dashboard):
-    """Post an immediate tweet at startup and log it to the dashboard."""
-    try:
-        result = bot.post_tweet()
-        logger.info("Initial startup tweet posted successfully.")
-    except Exception as e:
-        logger.error(f"Error posting initial startup tweet: {str(e)}")
-
 def run_bot_with_dashboard():
     global dashboard
-    dashboard = Dashboard()
+    from dashboard import Dashboard
+    start_metrics_server()
+    history = TweetHistory()
+    dashboard = Dashboard(history=history)
     dashboard.set_status("Active")
     dashboard.schedule_daily_reset()
 
     def bot_thread():
-        bot = KoiiBot(dashboard=dashboard)
-        run_initial_tweet(bot, dashboard)
+        bot = KoiiBot(dashboard=dashboard, history=history)
         bot.start()
 
     t_bot = threading.Thread(target=bot_thread, daemon=True)
@@ -96,8 +303,36 @@ def run_bot_with_dashboard():
     # Start the dashboard UI in the main thread
     dashboard.mainloop()
 
+def run_headless():
+    """
+    Run the bot without Tk, e.g. as a systemd service. Status is served as JSON
+    at /status next to /metrics; SIGTERM or Ctrl+C stops the bot cleanly.
+    """
+    bot = KoiiBot()
+    start_metrics_server(status=bot.status)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    bot.start()
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    logger.info("Shutting down headless KoiiBot.")
+    bot.stop()
+
 def main():
-    run_bot_with_dashboard()
+    parser = argparse.ArgumentParser(description="KoiiBot")
+    parser.add_argument('--headless', action='store_true', help='run without the Tk dashboard')
+    args = parser.parse_args()
+    configure_logging()
+    if not args.headless and sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        logger.info("No display available, running headless.")
+        args.headless = True
+    if args.headless:
+        run_headless()
+    else:
+        run_bot_with_dashboard()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))  # 0 disables the endpoint
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000)
+RECENT_SAMPLES = 1024  # samples kept per stage for percentile estimates
+
+
+class Histogram:
+    """Cumulative latency histogram plus a window of recent samples for percentiles."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value_ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value_ms
+        self.recent.append(value_ms)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class Metrics:
+    """
+    In-process registry of per-stage latency histograms, counters and gauges.
+    Stages are timed with `span()`; a span that raises also bumps the
+    `<stage>_errors` counter. With the `metrics` logger at DEBUG every span
+    is also logged as an event with its stage and duration_ms.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(f'{stage}_errors')
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.observe(stage, duration_ms)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[Metrics] {stage} took {duration_ms:.1f} ms",
+                             extra={'stage': stage, 'duration_ms': round(duration_ms, 1)})
+
+    def observe(self, stage, value_ms):
+        with self._lock:
+            self._histograms.setdefault(stage, Histogram()).observe(value_ms)
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def percentile(self, stage, q):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            return histogram.percentile(q) if histogram else None
+
+    def snapshot(self):
+        """JSON-serialisable view of every metric."""
+        with self._lock:
+            return {
+                'stages': {
+                    stage: {
+                        'count': h.count,
+                        'sum_ms': round(h.sum, 1),
+                        'p50_ms': _round(h.percentile(50)),
+                        'p95_ms': _round(h.percentile(95)),
+                        'p99_ms': _round(h.percentile(99)),
+                    }
+                    for stage, h in self._histograms.items()
+                },
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+            }
+
+    def take(self):
+        """
+        Hand over what was recorded since the last take(), for another
+        process's registry to merge(): stage samples and counter increments
+        are moved out, gauges are copied.
+        """
+        with self._lock:
+            histograms, counters = self._histograms, self._counters
+            self._histograms, self._counters = {}, {}
+            return {
+                'stages': {
+                    stage: {'bucket_counts': h.bucket_counts, 'count': h.count, 'sum': h.sum,
+                            'recent': list(h.recent)}
+                    for stage, h in histograms.items()
+                },
+                'counters': counters,
+                'gauges': dict(self._gauges),
+            }
+
+    def merge(self, delta):
+        """Add a take() from another registry (e.g. the browser worker's) to this one."""
+        with self._lock:
+            for stage, data in delta.get('stages', {}).items():
+                h = self._histograms.setdefault(stage, Histogram())
+                h.bucket_counts = [a + b for a, b in zip(h.bucket_counts, data['bucket_counts'])]
+                h.count += data['count']
+                h.sum += data['sum']
+                h.recent.extend(data['recent'])
+            for name, amount in delta.get('counters', {}).items():
+                self._counters[name] = self._counters.get(name, 0) + amount
+            self._gauges.update(delta.get('gauges', {}))
+
+    def render_prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP koii_stage_duration_ms Duration of each posting pipeline stage.',
+            '# TYPE koii_stage_duration_ms histogram',
+        ]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, h.bucket_counts):
+                    cumulative += count
+                    lines.append(f'koii_stage_duration_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'koii_stage_duration_ms_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'koii_stage_duration_ms_sum{{stage="{stage}"}} {h.sum:.1f}')
+                lines.append(f'koii_stage_duration_ms_count{{stage="{stage}"}} {h.count}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'# TYPE koii_{name}_total counter')
+                lines.append(f'koii_{name}_total {value}')
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f'# TYPE koii_{name} gauge')
+                lines.append(f'koii_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+# Process-wide registry used by every module
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    status = None  # optional callable returning a JSON-serialisable dict
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, metrics.render_prometheus(), 'text/plain; version=0.0.4')
+        elif self.path == '/metrics.json':
+            self._send(200, json.dumps(metrics.snapshot()), 'application/json')
+        elif self.path == '/log-levels':
+            from event_log import levels
+            self._send(200, json.dumps(levels()), 'application/json')
+        elif self.path == '/status' and self.status is not None:
+            try:
+                self._send(200, json.dumps(self.status(), default=str), 'application/json')
+            except Exception as e:
+                self._send(500, json.dumps({'error': str(e)}), 'application/json')
+        else:
+            self._send(404, 'Not found\n', 'text/plain')
+
+    def do_POST(self):
+        # Body "module=LEVEL,...", e.g. "twitter_web=DEBUG"; answers with the resulting levels
+        if self.path != '/log-levels':
+            self._send(404, 'Not found\n', 'text/plain')
+            return
+        from event_log import set_levels
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        try:
+            result = set_levels(body)
+        except ValueError as e:
+            self._send(400, json.dumps({'error': str(e)}), 'application/json')
+            return
+        logger.info(f"[Metrics] Log levels changed: {body.strip()}")
+        self._send(200, json.dumps(result), 'application/json')
+
+    def _send(self, status, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"[Metrics] {self.address_string()} {format % args}")
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT, status=None):
+    """
+    Serve /metrics (Prometheus), /metrics.json and /log-levels (GET to read,
+    POST "module=LEVEL,..." to change) on a daemon thread, plus /status when a
+    `status` callable is given.
+    Returns the server, or None when disabled or the port is unavailable.
+    """
+    if not port:
+        return None
+    handler = _MetricsHandler
+    if status is not None:
+        handler = type('StatusHandler', (_MetricsHandler,), {'status': staticmethod(status)})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error(f"[Metrics] Could not listen on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"[Metrics] Serving metrics on http://{host}:{port}/metrics")
+    return server
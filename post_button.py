@@ -0,0 +1,119 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Versioned table of places the composer's Post button has lived. Entries are
+# tried in order; 'text' restricts a match to elements whose label equals it
+# (the in-page equivalent of Playwright's :has-text()). Override the whole
+# table with a JSON file of the same shape via POST_BUTTON_SELECTORS_FILE.
+POST_BUTTON_SELECTORS = {
+    'version': '2025-06',
+    'selectors': [
+        {'css': 'div[aria-label="Tweet text"] button[aria-label="Post"]'},
+        {'css': 'div[aria-label="Tweet text"] button[data-testid="tweetButtonInline"]'},
+        {'css': 'div[data-testid="tweetTextarea_0"] button[data-testid="tweetButtonInline"]'},
+        {'css': 'div[aria-label="Tweet text"] button[type="submit"]'},
+        {'css': 'div[data-testid="tweetTextarea_0"] button[type="submit"]'},
+        {'css': 'div[aria-label="Tweet text"] button', 'text': 'Post'},
+        {'css': 'div[data-testid="tweetTextarea_0"] button', 'text': 'Post'},
+        {'css': 'div[aria-label="Tweet text"] [role="button"]', 'text': 'Post'},
+        {'css': 'div[data-testid="tweetTextarea_0"] [role="button"]', 'text': 'Post'},
+        {'css': '[data-testid="tweetButtonInline"]'},
+    ]
+}
+
+MARKER_ATTRIBUTE = 'data-koii-post-button'
+
+# Scores every candidate in a single round-trip. The winner is tagged with
+# MARKER_ATTRIBUTE so Python can address it through a stable locator; only
+# a small summary object travels back over CDP.
+LOCATE_JS = """({selectors, preferred, marker}) => {
+    document.querySelectorAll('[' + marker + ']').forEach(el => el.removeAttribute(marker));
+    const order = preferred === null ? selectors.map((_, i) => i)
+        : [preferred, ...selectors.map((_, i) => i).filter(i => i !== preferred)];
+    const excluded = new Map();
+    const isExcluded = el => {
+        const section = el.closest('section');
+        if (!section) return false;
+        if (!excluded.has(section)) {
+            const html = section.outerHTML.toLowerCase();
+            excluded.set(section, ['reply', 'modal', 'thread'].some(w => html.includes(w)));
+        }
+        return excluded.get(section);
+    };
+    const rank = {not_found: 0, excluded_context: 1, hidden: 2, disabled: 3};
+    let reason = 'not_found';
+    let candidates = 0;
+    for (const i of order) {
+        const entry = selectors[i];
+        let nodes;
+        try { nodes = document.querySelectorAll(entry.css); } catch (e) { continue; }
+        for (const el of nodes) {
+            if (entry.text && (el.innerText || '').trim() !== entry.text) continue;
+            candidates++;
+            let why;
+            if (isExcluded(el)) why = 'excluded_context';
+            else if (el.disabled || el.getAttribute('aria-disabled') === 'true') why = 'disabled';
+            else {
+                const rect = el.getBoundingClientRect();
+                const style = getComputedStyle(el);
+                if (!rect.width || !rect.height || style.visibility === 'hidden' || style.display === 'none') why = 'hidden';
+            }
+            if (!why) {
+                el.setAttribute(marker, '1');
+                return {index: i, reason: 'ok', candidates};
+            }
+            if (rank[why] > rank[reason]) reason = why;
+        }
+    }
+    return {index: null, reason, candidates};
+}"""
+
+
+def load_selector_table():
+    """Return the selector table, preferring POST_BUTTON_SELECTORS_FILE when set."""
+    path = os.getenv('POST_BUTTON_SELECTORS_FILE')
+    if path:
+        try:
+            with open(path, encoding='utf-8') as f:
+                table = json.load(f)
+            logger.info(f"[PostButton] Loaded selector table version {table.get('version')} from {path}")
+            return table
+        except Exception as e:
+            logger.error(f"[PostButton] Could not load {path}, using built-in table: {e}")
+    return POST_BUTTON_SELECTORS
+
+
+class PostButtonLocator:
+    """
+    Finds the composer's Post button with one page.evaluate call and remembers
+    which selector won last time so it is tried first on the next post.
+    """
+
+    def __init__(self, table=None):
+        self.table = table or load_selector_table()
+        self._preferred = None
+
+    @property
+    def version(self):
+        return self.table.get('version')
+
+    def locate(self, page):
+        """
+        Returns (locator, reason). reason is 'ok' when a clickable button was
+        found, otherwise one of 'disabled', 'hidden', 'excluded_context' or
+        'not_found' and locator is None.
+        """
+        result = page.evaluate(LOCATE_JS, {
+            'selectors': self.table['selectors'],
+            'preferred': self._preferred,
+            'marker': MARKER_ATTRIBUTE
+        })
+        if result['reason'] != 'ok':
+            return None, result['reason']
+        if result['index'] != self._preferred:
+            logger.debug(f"[PostButton] Selector #{result['index']} won: {self.table['selectors'][result['index']]['css']}")
+            self._preferred = result['index']
+        return page.locator(f'[{MARKER_ATTRIBUTE}="1"]').first, 'ok'
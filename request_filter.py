@@ -0,0 +1,118 @@
+import os
+import logging
+import threading
+from urllib.parse import urlparse
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def _env_list(name, default):
+    value = os.getenv(name) or default
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+BLOCK_REQUESTS = os.getenv('BLOCK_REQUESTS', 'true').lower() == 'true'
+BLOCK_RESOURCE_TYPES = _env_list('BLOCK_RESOURCE_TYPES', 'image,media,font')
+BLOCK_THIRD_PARTY = os.getenv('BLOCK_THIRD_PARTY', 'true').lower() == 'true'
+# Timeline prefetch and telemetry calls the composer does not need
+BLOCK_URL_PATTERNS = _env_list(
+    'BLOCK_URL_PATTERNS',
+    '/HomeTimeline,/HomeLatestTimeline,/ExploreSidebar,/jot/,/i/api/1.1/jot/,'
+    '/client_event,/badge_count,/live_pipeline/,/guide.json,/promoted_content/'
+)
+FIRST_PARTY_DOMAINS = ('twitter.com', 'x.com', 'twimg.com')
+# Third parties that login challenges depend on
+ALLOWED_THIRD_PARTY_DOMAINS = ('arkoselabs.com', 'arkoselabs.cn')
+# Rough transfer sizes used to estimate what blocking saved; Playwright never sees the bodies
+ESTIMATED_BYTES = {
+    'image': 40_000,
+    'media': 500_000,
+    'font': 60_000,
+    'script': 50_000,
+    'stylesheet': 20_000,
+    'xhr': 15_000,
+    'fetch': 15_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+
+def _matches_domain(host, domains):
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+class RequestFilter:
+    """
+    Aborts requests the posting flow does not need (media, fonts, third-party
+    trackers, timeline prefetch) through a context-wide route, and keeps
+    counts of what was blocked.
+    """
+
+    def __init__(self, enabled=BLOCK_REQUESTS, resource_types=BLOCK_RESOURCE_TYPES,
+                 block_third_party=BLOCK_THIRD_PARTY, url_patterns=BLOCK_URL_PATTERNS,
+                 first_party_domains=FIRST_PARTY_DOMAINS):
+        self.enabled = enabled
+        self.resource_types = set(resource_types)
+        self.block_third_party = block_third_party
+        self.url_patterns = tuple(url_patterns)
+        self.first_party_domains = tuple(first_party_domains)
+        self._stats = {'allowed': 0, 'blocked': 0, 'estimated_bytes_saved': 0, 'by_reason': {}}
+        self._lock = threading.Lock()
+
+    def install(self, context):
+        """Route every request of a browser context through the filter."""
+        if self.enabled:
+            context.route('**/*', self._handle)
+
+    async def install_async(self, context):
+        """install() for playwright.async_api contexts."""
+        if self.enabled:
+            await context.route('**/*', self._handle_async)
+
+    def block_reason(self, url, resource_type):
+        """Why a request would be blocked, or None to let it through."""
+        if resource_type in self.resource_types:
+            return resource_type
+        host = (urlparse(url).hostname or '').lower()
+        if (self.block_third_party and host
+                and not _matches_domain(host, self.first_party_domains)
+                and not _matches_domain(host, ALLOWED_THIRD_PARTY_DOMAINS)):
+            return 'third_party'
+        if any(pattern in url for pattern in self.url_patterns):
+            return 'pattern'
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'by_reason': dict(self._stats['by_reason'])}
+
+    def _should_block(self, request):
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason is None:
+            with self._lock:
+                self._stats['allowed'] += 1
+            return False
+        saved = ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+        with self._lock:
+            self._stats['blocked'] += 1
+            self._stats['estimated_bytes_saved'] += saved
+            self._stats['by_reason'][reason] = self._stats['by_reason'].get(reason, 0) + 1
+        metrics.inc('requests_blocked')
+        metrics.inc('request_bytes_saved_estimate', saved)
+        return True
+
+    def _handle(self, route):
+        if not self._should_block(route.request):
+            route.continue_()
+            return
+        try:
+            route.abort('blockedbyclient')
+        except Exception as e:
+            logger.debug(f"[RequestFilter] Could not abort {route.request.url}: {e}")
+
+    async def _handle_async(self, route):
+        if not self._should_block(route.request):
+            await route.continue_()
+            return
+        try:
+            await route.abort('blockedbyclient')
+        except Exception as e:
+            logger.debug(f"[RequestFilter] Could not abort {route.request.url}: {e}")
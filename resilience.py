@@ -0,0 +1,205 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('GEMINI_BREAKER_RESET', '120'))  # seconds
+BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', '2'))  # seconds
+BACKOFF_CAP = float(os.getenv('GEMINI_BACKOFF_CAP', '60'))  # seconds
+HEDGE_MIN_SAMPLES = 20  # successful calls needed before the observed p95 is trusted
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+def is_quota_error(error):
+    """True for rate-limit/quota errors (HTTP 429, gRPC RESOURCE_EXHAUSTED)."""
+    if getattr(error, 'code', None) == 429:
+        return True
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error)
+    return '429' in message or 'quota' in message.lower()
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through
+    (half-open) and closes again if it succeeds. The state is published as
+    the `<name>_circuit_state` gauge (0 closed, 1 half-open, 2 open).
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go out now. In half-open state only one trial call is allowed."""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            if self._state != CLOSED:
+                logger.info(f"[Breaker] {self.name} circuit closed.")
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"[Breaker] {self.name} circuit opened after {self._failures} failure(s).")
+                    metrics.inc(f'{self.name}_circuit_opened')
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _set_state(self, state):
+        self._state = state
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge(f'{self.name}_circuit_state', STATE_GAUGE[self._state])
+
+
+class ResilientCaller:
+    """
+    Runs provider calls with a hard per-call deadline. If the first call is
+    still running after the observed p95 latency of the `<name>_call` stage,
+    a second identical (hedged) call is sent and whichever succeeds first
+    wins. Every call outcome is fed to the circuit breaker.
+
+    Each request runs on its own daemon thread, so it starts (and its
+    deadline starts) right away: a call abandoned at its deadline keeps its
+    thread until the SDK returns, but never delays later calls. While
+    `max_in_flight` requests (abandoned ones included) are still running, no
+    hedges are sent.
+    """
+
+    def __init__(self, name, deadline, breaker=None, hedge=True, max_in_flight=4):
+        self.name = name
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge = hedge
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        if not self.hedge:
+            return None
+        snapshot = metrics.snapshot()['stages'].get(f'{self.name}_call')
+        if not snapshot or snapshot['count'] < HEDGE_MIN_SAMPLES:
+            return None
+        p95 = metrics.percentile(f'{self.name}_call', 95)
+        return min(p95 / 1000, self.deadline / 2)
+
+    def _submit(self, fn, args):
+        future = Future()
+        with self._lock:
+            self._in_flight += 1
+            metrics.set_gauge(f'{self.name}_in_flight', self._in_flight)
+
+        def run():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    metrics.set_gauge(f'{self.name}_in_flight', self._in_flight)
+
+        # Carry the caller's log_context (post_id) over to the call's thread
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(run,), name=f'{self.name}-call', daemon=True).start()
+        return future
+
+    def call(self, fn, *args, aborted=None):
+        """
+        Call fn(*args) under the deadline, breaker and hedging rules.
+        `aborted(result)` may flag results of calls that were cut short on
+        purpose (e.g. an early-aborted stream): they still count as a healthy
+        provider for the breaker but are left out of the latency stats, so
+        they do not pull down the hedge point.
+        """
+        if not self.breaker.allow():
+            metrics.inc(f'{self.name}_circuit_rejections')
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        start = time.monotonic()
+        hedge_at = self.hedge_delay()
+        pending = {self._submit(fn, args)}
+        first = next(iter(pending))
+        error = None
+        while pending:
+            now = time.monotonic()
+            until = start + self.deadline
+            if hedge_at is not None:
+                until = min(until, start + hedge_at)
+            done, pending = wait(pending, timeout=max(0, until - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.breaker.record_success()
+                    if aborted is None or not aborted(future.result()):
+                        metrics.observe(f'{self.name}_call', (time.monotonic() - start) * 1000)
+                    if future is not first:
+                        metrics.inc(f'{self.name}_hedge_wins')
+                    return future.result()
+                error = future.exception()
+            if hedge_at is not None and pending and time.monotonic() - start >= hedge_at:
+                if self._in_flight < self.max_in_flight:
+                    logger.info(f"[Breaker] {self.name} call slower than p95 ({hedge_at:.1f}s), sending a hedged request.")
+                    metrics.inc(f'{self.name}_hedges')
+                    pending.add(self._submit(fn, args))
+                else:
+                    metrics.inc(f'{self.name}_hedges_skipped')
+                hedge_at = None
+            elif pending and time.monotonic() - start >= self.deadline:
+                metrics.inc(f'{self.name}_deadline_exceeded')
+                error = TimeoutError(f"{self.name} call exceeded {self.deadline:.0f}s deadline")
+                break
+        self.breaker.record_failure()
+        raise error
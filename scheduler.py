@@ -1,58 +1,271 @@
+import os
+import time
+import sqlite3
 import logging
+import datetime
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.triggers.cron import CronTrigger
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Jobs and their last-run metadata survive restarts in this SQLite file
+SCHEDULER_DB = os.path.abspath(os.getenv('SCHEDULER_DB', 'scheduler.db'))
+POST_INTERVAL_HOURS = int(os.getenv('POST_INTERVAL_HOURS', '2'))  # a slot every N hours on the hour
+GENERATE_LEAD_MINUTES = int(os.getenv('GENERATE_LEAD_MINUTES', '10'))  # tweets are generated this long before a slot
+# catch_up: a slot missed while the bot was down is posted on restart if it is at most
+# MISFIRE_GRACE seconds late; skip: missed slots are dropped and the bot waits for the next one
+MISFIRE_POLICY = os.getenv('MISFIRE_POLICY', 'catch_up').lower()
+MISFIRE_GRACE = int(os.getenv('MISFIRE_GRACE', '3600'))  # seconds
+EXECUTOR_WORKERS = 2  # a generation job and a posting job may overlap
+SLOT_FORMAT = '%Y-%m-%d %H:%M'
+
+POST_JOB_ID = 'post_slot'
+GENERATE_JOB_ID = 'generate_slot'
+
+RUNS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_runs (
+    job_id TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    detail TEXT,
+    PRIMARY KEY (job_id, slot)
+);
+"""
+
+_active = None  # the running TweetScheduler; persisted jobs reach their callbacks through it
+
+
+def generate_job():
+    """Job entry point: prepare tweets for the upcoming slot."""
+    if _active is not None:
+        _active.run_generation()
+
+
+def post_job():
+    """Job entry point: post the current slot unless it already went out."""
+    if _active is not None:
+        _active.run_slot()
+
+
+def slot_start(now=None, interval_hours=POST_INTERVAL_HOURS):
+    """Start of the posting slot `now` falls in (local time)."""
+    now = now or datetime.datetime.now()
+    return now.replace(hour=now.hour - now.hour % interval_hours, minute=0, second=0, microsecond=0)
+
+
 class TweetScheduler:
-    def __init__(self, tweet_callback):
+    """
+    Runs each posting slot as two persisted APScheduler jobs: a generation
+    job GENERATE_LEAD_MINUTES ahead of the slot and a posting job on the hour.
+
+    Jobs live in a SQLite job store, so a restart keeps their schedule and
+    APScheduler sees the slots that were missed while the bot was down; the
+    MISFIRE_POLICY decides whether they are caught up. Every run is recorded
+    in the job_runs table, and a slot that was already posted (or whose post
+    was in flight when the bot died) is never posted again.
+    """
+
+    def __init__(self, tweet_callback, generate_callback=None, db_path=SCHEDULER_DB,
+                 interval_hours=POST_INTERVAL_HOURS, lead_minutes=GENERATE_LEAD_MINUTES,
+                 policy=MISFIRE_POLICY, grace=MISFIRE_GRACE):
         """
         Initialize the scheduler with a callback function that will be called
         when it's time to post a tweet.
-        
+
         Args:
             tweet_callback: Function to call when it's time to post a tweet
+            generate_callback: Optional function preparing tweets ahead of a slot
+            db_path: SQLite file holding the jobs and their run metadata
+            interval_hours: Hours between slots (a divisor of 24)
+            lead_minutes: Minutes before a slot the generation job runs
+            policy: 'catch_up' or 'skip', for slots missed while the bot was down
+            grace: Seconds a missed slot may be late and still be caught up
         """
-        self.scheduler = BackgroundScheduler()
+        if 24 % interval_hours:
+            raise ValueError(f"POST_INTERVAL_HOURS must divide 24, got {interval_hours}")
         self.tweet_callback = tweet_callback
-        
-    def schedule_tweets(self):
-        """Schedule a tweet every 2 hours on the hour."""
-        self.scheduler.add_job(
-            self.tweet_callback,
-            CronTrigger(minute=0, hour='*/2'),  # Every 2 hours at minute 0
-            id='bi_hourly_tweet',
-            replace_existing=True,
-            coalesce=True,
-            max_instances=1
+        self.generate_callback = generate_callback
+        self.db_path = db_path
+        self.interval_hours = interval_hours
+        self.lead_minutes = min(max(lead_minutes, 1), 59)
+        self.policy = policy
+        # A catch-up must land inside the slot it belongs to
+        self.grace = min(grace, interval_hours * 3600 - 60) if policy == 'catch_up' else 1
+        self.scheduler = BackgroundScheduler(
+            jobstores={
+                'default': SQLAlchemyJobStore(url=f'sqlite:///{db_path}'),
+                'memory': MemoryJobStore(),  # one-off jobs that need not survive a restart
+            },
+            executors={'default': ThreadPoolExecutor(EXECUTOR_WORKERS)},
+            job_defaults={'coalesce': True, 'max_instances': 1},
         )
-        logger.info("Scheduled tweets: 1 per 2 hours, every 2 hours on the hour.")
-    
+        self._jobs = []  # (job_id, func, trigger) registered by schedule_tweets()
+        self._runs_lock = threading.Lock()
+        self._runs = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._runs.executescript(RUNS_SCHEMA)
+
+    def schedule_tweets(self):
+        """
+        Register the generation and posting jobs. Jobs already in the store are
+        kept, so their next run time (and any misfire) survives the restart;
+        they are only rescheduled when the schedule configuration changed.
+        """
+        n = self.interval_hours
+        self._jobs = [(POST_JOB_ID, post_job, CronTrigger(minute=0, hour=f'*/{n}'))]
+        if self.generate_callback is not None:
+            # The hour before each slot, GENERATE_LEAD_MINUTES before the hour
+            trigger = CronTrigger(minute=60 - self.lead_minutes, hour=f'{n - 1}-23/{n}')
+            self._jobs.append((GENERATE_JOB_ID, generate_job, trigger))
+        if self.scheduler.running:
+            self._ensure_jobs()
+        logger.info(f"Scheduled tweets: 1 every {n} hour(s) on the hour, generated "
+                    f"{self.lead_minutes} minutes ahead (misfire policy: {self.policy}).")
+
+    def _ensure_jobs(self):
+        wanted = {job_id for job_id, _, _ in self._jobs}
+        for job_id in (POST_JOB_ID, GENERATE_JOB_ID):
+            if job_id not in wanted and self.scheduler.get_job(job_id) is not None:
+                self.scheduler.remove_job(job_id)
+        for job_id, func, trigger in self._jobs:
+            job = self.scheduler.get_job(job_id)
+            if job is None or str(job.trigger) != str(trigger):
+                self.scheduler.add_job(func, trigger, id=job_id, replace_existing=True, misfire_grace_time=self.grace)
+            elif job.misfire_grace_time != self.grace:
+                job.modify(misfire_grace_time=self.grace)
+
+    def catch_up(self, last_posted_at=None):
+        """
+        On startup: post the current slot now if the policy allows it, the slot
+        started at most `grace` seconds ago and nothing was posted in it yet
+        (`last_posted_at` is the newest history timestamp). Returns True when a
+        catch-up post was queued.
+        """
+        if self.policy != 'catch_up':
+            return False
+        now = datetime.datetime.now()
+        slot = slot_start(now, self.interval_hours)
+        if (now - slot).total_seconds() > self.grace:
+            return False
+        if last_posted_at and last_posted_at >= slot.strftime('%Y-%m-%d %H:%M:%S'):
+            logger.info(f"Slot {slot:%H:%M} was already posted at {last_posted_at}, no catch-up needed.")
+            return False
+        if self._run_status(POST_JOB_ID, slot) in ('ok', 'running'):
+            return False
+        logger.info(f"Slot {slot:%H:%M} was missed, catching up now.")
+        self.scheduler.add_job(post_job, jobstore='memory', id='catch_up', replace_existing=True)
+        return True
+
+    def run_slot(self):
+        """Post the current slot once; later calls for the same slot are skipped."""
+        slot = slot_start(interval_hours=self.interval_hours)
+        if not self._claim(POST_JOB_ID, slot):
+            logger.info(f"Slot {slot:%H:%M} already posted or in progress, skipping.")
+            return
+        self._run(POST_JOB_ID, slot, self.tweet_callback)
+
+    def run_generation(self):
+        """Prepare tweets for the slot that starts after this run."""
+        slot = slot_start(interval_hours=self.interval_hours) + datetime.timedelta(hours=self.interval_hours)
+        if self._claim(GENERATE_JOB_ID, slot):
+            self._run(GENERATE_JOB_ID, slot, self.generate_callback)
+
+    def _run(self, job_id, slot, callback):
+        try:
+            callback()
+        except Exception as e:
+            self._finish(job_id, slot, 'failed', str(e))
+            logger.error(f"Job {job_id} for slot {slot:%H:%M} failed: {e}")
+            return
+        self._finish(job_id, slot, 'ok')
+
+    def _claim(self, job_id, slot):
+        """Record the start of a run; False if the slot already ran (or is running)."""
+        key = slot.strftime(SLOT_FORMAT)
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self._runs_lock, self._runs:
+            row = self._runs.execute(
+                'SELECT status FROM job_runs WHERE job_id = ? AND slot = ?', (job_id, key)
+            ).fetchone()
+            if row is not None and row[0] != 'failed':
+                return False
+            self._runs.execute(
+                'INSERT OR REPLACE INTO job_runs (job_id, slot, started_at, status) VALUES (?, ?, ?, ?)',
+                (job_id, key, now, 'running')
+            )
+        return True
+
+    def _finish(self, job_id, slot, status, detail=None):
+        with self._runs_lock, self._runs:
+            self._runs.execute(
+                'UPDATE job_runs SET finished_at = ?, status = ?, detail = ? WHERE job_id = ? AND slot = ?',
+                (time.strftime('%Y-%m-%d %H:%M:%S'), status, detail, job_id, slot.strftime(SLOT_FORMAT))
+            )
+
+    def _run_status(self, job_id, slot):
+        with self._runs_lock:
+            row = self._runs.execute(
+                'SELECT status FROM job_runs WHERE job_id = ? AND slot = ?', (job_id, slot.strftime(SLOT_FORMAT))
+            ).fetchone()
+        return row[0] if row else None
+
+    def last_runs(self):
+        """Most recent run of each job: {job_id: {slot, started_at, finished_at, status, detail}}."""
+        with self._runs_lock:
+            rows = self._runs.execute(
+                'SELECT job_id, slot, started_at, finished_at, status, detail FROM job_runs r '
+                'WHERE slot = (SELECT MAX(slot) FROM job_runs WHERE job_id = r.job_id)'
+            ).fetchall()
+        return {
+            job_id: {'slot': slot, 'started_at': started, 'finished_at': finished, 'status': status, 'detail': detail}
+            for job_id, slot, started, finished, status, detail in rows
+        }
+
+    def next_run_time(self, job_id=POST_JOB_ID):
+        """When the job (by default the next post) is due, or None if nothing is scheduled."""
+        job = self.scheduler.get_job(job_id)
+        return job.next_run_time if job else None
+
     def start(self):
-        """Start the scheduler."""
-        self.scheduler.start()
+        """
+        Start the scheduler. The stored jobs are reconciled with the current
+        configuration first; then slots missed while the bot was down are
+        caught up or skipped according to the misfire policy.
+        """
+        global _active
+        _active = self
+        self.scheduler.start(paused=True)
+        self._ensure_jobs()
+        self.scheduler.resume()
         logger.info("Tweet scheduler started")
-    
+
     def stop(self):
         """Stop the scheduler."""
+        global _active
         self.scheduler.shutdown()
+        if _active is self:
+            _active = None
+        with self._runs_lock:
+            self._runs.close()
         logger.info("Tweet scheduler stopped")
 
 if __name__ == "__main__":
     # Test the scheduler
     def test_callback():
         logger.info("Test callback executed")
-    
-    scheduler = TweetScheduler(test_callback)
+
+    from event_log import configure_logging
+    configure_logging()
+    scheduler = TweetScheduler(test_callback, test_callback)
     scheduler.schedule_tweets()
     scheduler.start()
-    
+    logger.info(f"Next post at {scheduler.next_run_time()}, last runs: {scheduler.last_runs()}")
+
     # Keep the script running for a while to test
-    import time
     time.sleep(10)
-    scheduler.stop() 
\ No newline at end of file
+    scheduler.stop()
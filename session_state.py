@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import pickle
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = os.path.abspath('twitter_state.json')
+LEGACY_COOKIES_PATH = os.path.abspath('twitter_cookies.pkl')
+AUTH_COOKIES = ('auth_token', 'ct0')
+AUTH_DOMAINS = ('x.com', 'twitter.com')
+EXPIRY_MARGIN = 300  # seconds; cookies this close to expiry count as expired
+REFRESH_WINDOW = float(os.getenv('SESSION_REFRESH_WINDOW', str(7 * 24 * 3600)))  # seconds
+SAVE_INTERVAL = 24 * 3600  # re-save storage state at most this often when nothing changed
+
+
+def _is_auth_domain(domain):
+    domain = (domain or '').lstrip('.')
+    return any(domain == d or domain.endswith('.' + d) for d in AUTH_DOMAINS)
+
+
+def auth_expiry(cookies):
+    """
+    Earliest expiry (epoch seconds) of the auth cookies in a Playwright cookie
+    list, float('inf') for session cookies, or None when any is missing.
+    """
+    expiries = {}
+    for cookie in cookies:
+        if cookie.get('name') in AUTH_COOKIES and _is_auth_domain(cookie.get('domain')):
+            expires = cookie.get('expires', -1)
+            expiry = float('inf') if expires is None or expires < 0 else expires
+            expiries[cookie['name']] = max(expiry, expiries.get(cookie['name'], 0))
+    if len(expiries) < len(AUTH_COOKIES):
+        return None
+    return min(expiries.values())
+
+
+class SessionStateCache:
+    """
+    Saved Playwright storage state for the X account.
+
+    Lets the client decide from the auth cookies alone whether it is logged
+    in, instead of waiting on the Profile link. The legacy
+    twitter_cookies.pkl is imported once when no state file exists yet.
+    """
+
+    def __init__(self, path=STATE_PATH, legacy_cookies_path=LEGACY_COOKIES_PATH):
+        self.path = path
+        self.legacy_cookies_path = legacy_cookies_path
+        self.state = None
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def cookies(self):
+        return (self.state or {}).get('cookies', [])
+
+    def is_valid(self, cookies=None):
+        """True when the auth cookies exist and do not expire within EXPIRY_MARGIN."""
+        expiry = auth_expiry(self.cookies if cookies is None else cookies)
+        return expiry is not None and expiry > time.time() + EXPIRY_MARGIN
+
+    def needs_refresh(self, cookies=None):
+        """True when the auth cookies are valid but expire within REFRESH_WINDOW."""
+        expiry = auth_expiry(self.cookies if cookies is None else cookies)
+        return expiry is not None and self.is_valid(cookies) and expiry < time.time() + REFRESH_WINDOW
+
+    def seed(self, context):
+        """Copy cached cookies into a context that has no valid auth cookies of its own."""
+        if self.is_valid() and not self.is_valid(context.cookies()):
+            context.add_cookies(self.cookies)
+            logger.info("[Session] Seeded browser context from saved session state.")
+
+    def save(self, context, force=True):
+        """Persist the context's storage state (skipped if recent, unless forced)."""
+        if not force and time.time() - self._saved_at < SAVE_INTERVAL:
+            return
+        state = context.storage_state()
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+            self.state = state
+            self._saved_at = time.time()
+
+    def invalidate(self):
+        with self._lock:
+            self.state = None
+            self._saved_at = 0.0
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.state = json.load(f)
+            self._saved_at = os.path.getmtime(self.path)
+            return
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"[Session] Could not read {self.path}: {e}")
+        try:
+            with open(self.legacy_cookies_path, 'rb') as f:
+                cookies = pickle.load(f)
+            self.state = {'cookies': list(cookies), 'origins': []}
+            logger.info(f"[Session] Imported {len(cookies)} cookies from {self.legacy_cookies_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"[Session] Could not import {self.legacy_cookies_path}: {e}")
@@ -0,0 +1,261 @@
+import os
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+from metrics import metrics
+from twitter_web import PostRejectedError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Transports to use, in order of preference until latency has been measured
+POST_TRANSPORTS = [t.strip() for t in os.getenv('POST_TRANSPORTS', 'api,browser').split(',') if t.strip()]
+# Overridable so the API transport can be pointed at a local mock server
+TWITTER_API_BASE_URL = os.getenv('TWITTER_API_BASE_URL', 'https://api.twitter.com').rstrip('/')
+# OAuth 2.0 user-context access token; the OAuth 1.0a keys of twitter.py are used otherwise
+TWITTER_API_BEARER_TOKEN = os.getenv('TWITTER_API_BEARER_TOKEN')
+API_TIMEOUT = float(os.getenv('TWITTER_API_TIMEOUT', '10'))  # seconds
+EWMA_ALPHA = 0.3  # weight of the newest sample in the latency/error averages
+UNHEALTHY_ERROR_RATE = float(os.getenv('TRANSPORT_UNHEALTHY_ERROR_RATE', '0.5'))
+UNHEALTHY_COOLDOWN = float(os.getenv('TRANSPORT_COOLDOWN', '300'))  # seconds before retrying a sick transport
+
+
+class PostOutcomeUnknownError(Exception):
+    """
+    The post request reached X but no answer came back (read timeout, 5xx), so
+    the tweet may exist; posting it again through another transport could
+    post it twice.
+    """
+
+
+class BrowserTransport:
+    """Posts through browser automation (TwitterWebClient or BrowserWorker)."""
+
+    name = 'browser'
+
+    def __init__(self, client):
+        self.client = client
+
+    def post(self, tweet_text: str, trace_id=None) -> dict:
+        return self.client.post_tweet_web(tweet_text, trace_id=trace_id)
+
+    def close(self):
+        self.client.close()
+
+
+class HttpApiTransport:
+    """
+    Posts through the X API v2 (POST /2/tweets) on one pooled keep-alive
+    session, so a post costs a single HTTPS request on a warm connection.
+    """
+
+    name = 'api'
+
+    def __init__(self, base_url=TWITTER_API_BASE_URL, bearer_token=TWITTER_API_BEARER_TOKEN, timeout=API_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if bearer_token:
+            self.session.headers['Authorization'] = f'Bearer {bearer_token}'
+        else:
+            self.session.auth = _oauth1_from_env()
+
+    @classmethod
+    def configured(cls):
+        """True when credentials for the API transport are present."""
+        if TWITTER_API_BEARER_TOKEN:
+            return True
+        return all(os.getenv(key) for key in (
+            'TWITTER_API_KEY', 'TWITTER_API_SECRET', 'TWITTER_ACCESS_TOKEN', 'TWITTER_ACCESS_SECRET'
+        ))
+
+    def post(self, tweet_text: str, trace_id=None) -> dict:
+        # trace_id only names browser captures; this transport's records carry it via log_context
+        start = time.monotonic()
+        try:
+            response = self.session.post(f'{self.base_url}/2/tweets', json={'text': tweet_text}, timeout=self.timeout)
+        except requests.RequestException as e:
+            if _not_sent(e):
+                raise
+            raise PostOutcomeUnknownError(f"X API request may have been accepted: {e}") from e
+        latency_ms = round((time.monotonic() - start) * 1000)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code == 403 and 'duplicate' in str(payload).lower():
+            raise PostRejectedError(f"X rejected the tweet: {_error_message(payload, response)}")
+        if response.status_code >= 500:
+            raise PostOutcomeUnknownError(f"X API error after the request was sent: {_error_message(payload, response)}")
+        if not response.ok:
+            raise Exception(f"X API error: {_error_message(payload, response)}")
+        return {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'text': tweet_text,
+            'id': payload.get('data', {}).get('id'),
+            'latency_ms': latency_ms
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def _oauth1_from_env():
+    from requests_oauthlib import OAuth1  # installed with tweepy
+    return OAuth1(
+        os.getenv('TWITTER_API_KEY'), os.getenv('TWITTER_API_SECRET'),
+        os.getenv('TWITTER_ACCESS_TOKEN'), os.getenv('TWITTER_ACCESS_SECRET')
+    )
+
+
+def _not_sent(error):
+    """True for request errors raised before X could have received the post."""
+    if isinstance(error, (requests.exceptions.ConnectTimeout, requests.exceptions.SSLError,
+                          requests.exceptions.InvalidURL, requests.exceptions.MissingSchema)):
+        return True
+    # Connect failures come wrapped: ConnectionError(MaxRetryError(reason=NewConnectionError))
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def _error_message(payload, response):
+    for key in ('detail', 'title'):
+        if payload.get(key):
+            return f"{payload[key]} (HTTP {response.status_code})"
+    errors = payload.get('errors')
+    if errors:
+        return f"{errors[0].get('message')} (HTTP {response.status_code})"
+    return f"HTTP {response.status_code}"
+
+
+class _TransportStats:
+    def __init__(self):
+        self.latency_ms = None  # EWMA of successful posts
+        self.error_rate = 0.0  # EWMA of 0/1 outcomes
+        self.unhealthy_until = 0.0
+        self.attempts = 0
+
+    def record(self, ok, latency_ms=None):
+        self.attempts += 1
+        self.error_rate = EWMA_ALPHA * (0.0 if ok else 1.0) + (1 - EWMA_ALPHA) * self.error_rate
+        if ok:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms = EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.latency_ms
+        if not ok and self.error_rate >= UNHEALTHY_ERROR_RATE:
+            self.unhealthy_until = time.monotonic() + UNHEALTHY_COOLDOWN
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.unhealthy_until
+
+
+class TransportRouter:
+    """
+    Sends each post through the fastest healthy transport and falls back to
+    the next one when it fails. Transports that have succeeded are ranked by
+    an EWMA of their latency inflated by their error rate, ahead of untried
+    ones (which are only explored, in configured order, while nothing has
+    succeeded yet or as a fallback) and of ones that have only ever failed.
+    A transport whose error rate crosses TRANSPORT_UNHEALTHY_ERROR_RATE is
+    skipped for TRANSPORT_COOLDOWN seconds (but still used as a last
+    resort). A PostRejectedError is final:
+    X refused the content, so another transport would be refused too. So is
+    a PostOutcomeUnknownError: the tweet may already be live, and posting it
+    again could double-post it.
+    """
+
+    def __init__(self, transports):
+        if not transports:
+            raise ValueError("TransportRouter needs at least one transport")
+        self.transports = list(transports)
+        self._stats = {t.name: _TransportStats() for t in self.transports}
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        """Transports in the order the next post will try them."""
+        with self._lock:
+            def key(item):
+                position, transport = item
+                stats = self._stats[transport.name]
+                if stats.latency_ms is not None:
+                    return (not stats.healthy, 0, stats.latency_ms / max(0.05, 1 - stats.error_rate), position)
+                # Unmeasured: untried ones before those that have only failed
+                return (not stats.healthy, 1 if stats.attempts == 0 else 2, 0.0, position)
+            return [t for _, t in sorted(enumerate(self.transports), key=key)]
+
+    def post(self, tweet_text: str, trace_id=None) -> dict:
+        last_error = None
+        for transport in self.ranked():
+            start = time.monotonic()
+            try:
+                with metrics.span(f'transport_{transport.name}'):
+                    result = transport.post(tweet_text, trace_id)
+            except PostRejectedError:
+                self._record(transport, True, (time.monotonic() - start) * 1000)
+                raise
+            except PostOutcomeUnknownError:
+                # The tweet may be live; a retry elsewhere could double-post it
+                self._record(transport, False)
+                metrics.inc('transport_outcome_unknown')
+                raise
+            except Exception as e:
+                last_error = e
+                self._record(transport, False)
+                logger.warning(f"[Transport] {transport.name} failed, falling back: {e}")
+                metrics.inc('transport_fallbacks')
+                continue
+            self._record(transport, True, (time.monotonic() - start) * 1000)
+            result['transport'] = transport.name
+            return result
+        raise last_error
+
+    def close(self):
+        for transport in self.transports:
+            try:
+                transport.close()
+            except Exception as e:
+                logger.error(f"[Transport] Error closing {transport.name}: {e}")
+
+    def _record(self, transport, ok, latency_ms=None):
+        with self._lock:
+            stats = self._stats[transport.name]
+            was_healthy = stats.healthy
+            stats.record(ok, latency_ms)
+            if was_healthy and not stats.healthy:
+                logger.warning(f"[Transport] {transport.name} marked unhealthy for {UNHEALTHY_COOLDOWN:.0f}s.")
+            if stats.latency_ms is not None:
+                metrics.set_gauge(f'transport_{transport.name}_latency_ms', round(stats.latency_ms, 1))
+            metrics.set_gauge(f'transport_{transport.name}_error_rate', round(stats.error_rate, 3))
+            metrics.set_gauge(f'transport_{transport.name}_healthy', int(stats.healthy))
+
+
+def build_transports(web_client_factory, names=POST_TRANSPORTS):
+    """
+    Transports named in POST_TRANSPORTS; the API is skipped without credentials.
+    `web_client_factory` returns the browser client and is only called when a
+    browser transport is needed, so an API-only setup needs no X login.
+    """
+    transports = []
+    for name in names:
+        if name == 'browser':
+            transports.append(BrowserTransport(web_client_factory()))
+        elif name == 'api':
+            if HttpApiTransport.configured():
+                transports.append(HttpApiTransport())
+            else:
+                logger.info("[Transport] No X API credentials, using the browser only.")
+        else:
+            logger.warning(f"[Transport] Unknown transport '{name}' in POST_TRANSPORTS, ignoring it.")
+    if not transports:
+        transports.append(BrowserTransport(web_client_factory()))
+    return transports
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BUFFER_PATH = os.path.abspath('tweet_buffer.json')
+BUFFER_DEPTH = int(os.getenv('TWEET_BUFFER_DEPTH', '3'))
+BUFFER_MAX_AGE = float(os.getenv('TWEET_BUFFER_MAX_AGE', str(24 * 3600)))  # seconds
+REFILL_INTERVAL = 300  # seconds between refill checks when nothing wakes the worker
+
+
+class TweetBuffer:
+    """
+    Bounded, persisted queue of ready-to-post tweets.
+
+    A background worker keeps the buffer topped up to `depth` by calling
+    `generate(n)`, so posting only has to pop a tweet instead of waiting on
+    Gemini. Tweets older than `max_age` seconds are discarded.
+    """
+
+    def __init__(self, generate, depth=BUFFER_DEPTH, max_age=BUFFER_MAX_AGE, path=BUFFER_PATH):
+        """
+        Args:
+            generate: Callable taking a count and returning a list of up to that
+                many validated tweets (empty on failure)
+            depth: Number of tweets to keep ready
+            max_age: Seconds after which a buffered tweet is dropped
+            path: JSON file the buffer is persisted to
+        """
+        self.generate = generate
+        self.depth = depth
+        self.max_age = max_age
+        self.path = path
+        self._items = deque()
+        self._lock = threading.Lock()
+        # One refill at a time, so the worker and the generation job never both call Gemini
+        # for the same gap; pop() only takes _lock and never waits for a refill
+        self._refill_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._load()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def start(self):
+        """Start the background refill worker."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='tweet-buffer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refill worker."""
+        self._stopped.set()
+        self._wake.set()
+
+    def pop(self):
+        """Return the oldest fresh tweet, or None when the buffer is empty."""
+        with self._lock:
+            self._evict_expired()
+            item = self._items.popleft() if self._items else None
+            self._save()
+        self._wake.set()
+        return item['text'] if item else None
+
+    def refill(self, minimum=0):
+        """
+        Generate tweets until the buffer is full, or holds at least `minimum`
+        tweets when that is more than its depth. Returns how many were added.
+        A call made while another refill runs waits for it, then only tops up
+        what is still missing.
+        """
+        added = 0
+        target = max(self.depth, minimum)
+        with self._refill_lock:
+            while not self._stopped.is_set():
+                with self._lock:
+                    self._evict_expired()
+                    missing = target - len(self._items)
+                if missing <= 0:
+                    break
+                texts = self.generate(missing)
+                if not texts:
+                    logger.warning("[Buffer] Generation failed, will retry later.")
+                    break
+                with self._lock:
+                    now = time.time()
+                    for text in texts[:missing]:
+                        self._items.append({'text': text, 'created_at': now})
+                    self._save()
+                added += len(texts[:missing])
+        if added:
+            logger.info(f"[Buffer] Added {added} tweet(s), {len(self)} ready.")
+        return added
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                logger.error(f"[Buffer] Error refilling tweet buffer: {e}")
+            self._wake.wait(REFILL_INTERVAL)
+            self._wake.clear()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.max_age
+        while self._items and self._items[0]['created_at'] < cutoff:
+            dropped = self._items.popleft()
+            logger.info(f"[Buffer] Dropped stale tweet: {dropped['text'][:40]}...")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                items = json.load(f)
+            self._items.extend(items[-self.depth:] if self.depth else [])
+            self._evict_expired()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"[Buffer] Could not load {self.path}: {e}")
+
+    def _save(self):
+        metrics.set_gauge('tweet_buffer_depth', len(self._items))
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(list(self._items), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"[Buffer] Could not persist buffer: {e}")
@@ -0,0 +1,188 @@
+import re
+import unicodedata
+from bisect import bisect_right
+
+# X's weighted length rules (twitter-text v3 configuration): code points in
+# these ranges weigh 1, every other code point 2, an emoji sequence 2 and a URL
+# 23 however long it is. A tweet may weigh at most 280.
+MAX_WEIGHTED_LENGTH = 280
+URL_WEIGHT = 23
+DEFAULT_WEIGHT = 2
+LIGHT_RANGES = (
+    (0x0000, 0x10FF),  # Latin, Greek, Cyrillic, Hebrew, Arabic, Indic, ...
+    (0x2000, 0x200D),  # spaces and zero-width characters
+    (0x2010, 0x201F),  # dashes and quotes
+    (0x2032, 0x2037),  # primes
+)
+# Starts of emoji presentation sequences; together with the modifiers below
+# these decide what counts as one emoji
+EMOJI_RANGES = (
+    (0x203C, 0x203C), (0x2049, 0x2049), (0x2122, 0x2122), (0x2139, 0x2139),
+    (0x2194, 0x21AA), (0x231A, 0x23FF), (0x24C2, 0x24C2), (0x25AA, 0x25FE),
+    (0x2600, 0x27BF), (0x2934, 0x2935), (0x2B05, 0x2B55), (0x3030, 0x3030),
+    (0x303D, 0x303D), (0x3297, 0x3299), (0x1F000, 0x1FAFF),
+)
+
+TLDS = ('com', 'net', 'org', 'io', 'network', 'xyz', 'ai', 'app', 'co', 'dev', 'gg', 'me')
+URL_PATTERN = re.compile(
+    r'(?:(?:https?://|www\.)\S+?'
+    rf'|\b[a-z0-9-]+(?:\.[a-z0-9-]+)*\.(?:{"|".join(TLDS)})\b(?:/\S*?)?)'
+    r'(?=[.,!?;:)]*(?:\s|$))',  # trailing punctuation is not part of the URL
+    re.IGNORECASE
+)
+# Cheap pre-check: text without '://', 'www.' or a TLD cannot contain a URL
+_TLD_HINT = re.compile(rf'\.(?:{"|".join(TLDS)})\b', re.IGNORECASE)
+_WORD_END = re.compile(r'\s|$')
+SENTENCE_END = re.compile(r'[.!?](?=\s|$)')
+
+
+def _char_class(ranges):
+    return ''.join(
+        re.escape(chr(start)) if start == end else f'{re.escape(chr(start))}-{re.escape(chr(end))}'
+        for start, end in ranges
+    )
+
+
+# Precomputed from the tables above. Per code point lookups bisect the range
+# tables; whole strings are counted with regexes compiled from the same tables.
+_LIGHT_STARTS = tuple(start for start, _ in LIGHT_RANGES)
+_LIGHT_ENDS = tuple(end for _, end in LIGHT_RANGES)
+_HEAVY_CHAR = re.compile(f'[^{_char_class(LIGHT_RANGES)}]')
+_EMOJI_BASE = _char_class(EMOJI_RANGES)
+# variation selector 16, keycap, skin tones, and tag characters of subdivision flags
+_EMOJI_MODIFIER = '\uFE0F\u20E3\U0001F3FB-\U0001F3FF\U000E0020-\U000E007F'
+EMOJI_SEQUENCE = re.compile(
+    '[\U0001F1E6-\U0001F1FF]{2}'  # flag: pair of regional indicators
+    f'|(?:[{_EMOJI_BASE}]|[0-9#*]\u20E3|\\S\uFE0F)'  # emoji, keycap, or text char + VS16 ('©️')
+    f'(?:[{_EMOJI_MODIFIER}]|\u200D[{_EMOJI_BASE}])*'  # modifiers and ZWJ-joined emoji
+)
+_EMOJI_TRIGGERS = frozenset((0xFE0F, 0x20E3))
+# Code points that can take part in an emoji sequence, for the bisect pre-check
+_EMOJI_CHAR_RANGES = tuple(sorted(EMOJI_RANGES + ((0x20E3, 0x20E3), (0xFE0F, 0xFE0F))))
+_EMOJI_STARTS = tuple(start for start, _ in _EMOJI_CHAR_RANGES)
+_EMOJI_ENDS = tuple(end for _, end in _EMOJI_CHAR_RANGES)
+
+
+def _in_ranges(cp, starts, ends):
+    i = bisect_right(starts, cp) - 1
+    return i >= 0 and cp <= ends[i]
+
+
+def char_weight(cp):
+    """Weight of a single code point outside emoji sequences and URLs."""
+    return 1 if _in_ranges(cp, _LIGHT_STARTS, _LIGHT_ENDS) else DEFAULT_WEIGHT
+
+
+def _plain_weight(text):
+    return len(text) + len(_HEAVY_CHAR.findall(text))
+
+
+def _segment_weight(segment):
+    if segment.isascii():
+        return len(segment)
+    weight = len(segment)
+    consumed = 0  # end of the last emoji sequence
+    # Every emoji code point is heavy, so sequences are only looked for at heavy characters
+    for match in _HEAVY_CHAR.finditer(segment):
+        weight += 1
+        pos = match.start()
+        if pos < consumed:
+            continue
+        cp = ord(segment[pos])
+        if not _in_ranges(cp, _EMOJI_STARTS, _EMOJI_ENDS):
+            continue
+        start = pos - 1 if cp in _EMOJI_TRIGGERS and pos - 1 >= consumed else pos  # '©️', '1️⃣'
+        sequence = EMOJI_SEQUENCE.match(segment, start) or EMOJI_SEQUENCE.match(segment, pos)
+        if sequence:
+            consumed = sequence.end()
+            weight += DEFAULT_WEIGHT - _plain_weight(sequence.group())
+    return weight
+
+
+def _urls(text):
+    """
+    Yield (start, end) of each URL. Every URL we recognise contains a dot, so
+    the pattern only runs on the whitespace-delimited words around dots.
+    """
+    if '://' not in text and 'www.' not in text and not _TLD_HINT.search(text):
+        return
+    dot = text.find('.')
+    while dot != -1:
+        start = max(text.rfind(' ', 0, dot), text.rfind('\n', 0, dot)) + 1
+        end = _WORD_END.search(text, dot).start()
+        match = URL_PATTERN.search(text, start, end)
+        if match:
+            yield match.span()
+        dot = text.find('.', end)
+
+
+def weighted_length(text):
+    """Length of `text` as X counts it (NFC-normalised, see the module constants)."""
+    if not text.isascii():
+        text = unicodedata.normalize('NFC', text)
+    total = 0
+    pos = 0
+    for start, end in _urls(text):
+        total += _segment_weight(text[pos:start]) + URL_WEIGHT
+        pos = end
+    return total + _segment_weight(text[pos:])
+
+
+def _units(text):
+    """
+    Yield (end, weight) for each unit X counts: a URL, an emoji sequence or a
+    single code point. `end` is the index just past the unit.
+    """
+    pos = 0
+    for start, end in _urls(text):
+        yield from _plain_units(text, pos, start)
+        pos = end
+        yield pos, URL_WEIGHT
+    yield from _plain_units(text, pos, len(text))
+
+
+def _plain_units(text, start, stop):
+    i = start
+    while i < stop:
+        cp = ord(text[i])
+        if cp >= 0x80 or (i + 1 < stop and ord(text[i + 1]) in _EMOJI_TRIGGERS):
+            match = EMOJI_SEQUENCE.match(text, i, stop)
+            if match:
+                i = match.end()
+                yield i, DEFAULT_WEIGHT
+                continue
+        i += 1
+        yield i, char_weight(cp)
+
+
+def is_valid_length(text, limit=MAX_WEIGHTED_LENGTH):
+    return weighted_length(text) <= limit
+
+
+def truncate(text, limit=MAX_WEIGHTED_LENGTH):
+    """
+    Shorten `text` to at most `limit` weighted characters. Cuts after the last
+    complete sentence when that keeps at least half the limit, otherwise at
+    the last word boundary. URLs and emoji sequences are never split.
+    """
+    text = unicodedata.normalize('NFC', text).strip()
+    if weighted_length(text) <= limit:
+        return text
+    total = 0
+    fits = 0  # index just past the longest prefix within the limit
+    weight_at = {}
+    for end, weight in _units(text):
+        if total + weight > limit:
+            break
+        total += weight
+        fits = end
+        weight_at[end] = total
+    prefix = text[:fits]
+    sentence_ends = [m.end() for m in SENTENCE_END.finditer(prefix)]
+    if sentence_ends and weight_at.get(sentence_ends[-1], 0) >= limit / 2:
+        return prefix[:sentence_ends[-1]].strip()
+    if fits < len(text) and not text[fits].isspace():
+        space = prefix.rfind(' ')
+        if space > 0:
+            prefix = prefix[:space]
+    return prefix.rstrip(' ,;:-')
@@ -1,17 +1,72 @@
 import os
-import asyncio
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from dotenv import load_dotenv
-import pickle
+from browser_session import BrowserSession
+from post_button import PostButtonLocator
+from metrics import metrics
+from request_filter import RequestFilter, FIRST_PARTY_DOMAINS
+from session_state import SessionStateCache
+from diagnostics import Diagnostics, new_trace_id
+from event_log import log_context
+import threading
+import logging
 import time
 import re
+from urllib.parse import urlparse
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 TWITTER_USERNAME = os.getenv('TWITTER_USERNAME')
 TWITTER_PASSWORD = os.getenv('TWITTER_PASSWORD')
 HEADLESS = os.getenv('HEADLESS', 'true').lower() == 'true'
 USER_DATA_DIR = os.path.abspath('pw_user_data')  # Persistent profile
+# Overridable so the offline benchmark can point the client at a local stand-in
+TWITTER_BASE_URL = os.getenv('TWITTER_BASE_URL', 'https://twitter.com').rstrip('/')
+HOME_URL = f'{TWITTER_BASE_URL}/home'
+LOGIN_URL = f'{TWITTER_BASE_URL}/login'
+STATUS_URL = TWITTER_BASE_URL + '/i/status/{tweet_id}'
+TWEET_BOX_SELECTOR = 'div[aria-label="Tweet text"], div[data-testid="tweetTextarea_0"]'
+# How a post is confirmed: 'network' waits for the CreateTweet response, 'dom' for the composer to clear
+CONFIRM_MODE = os.getenv('CONFIRM_MODE', 'network').lower()
+CONFIRM_TIMEOUT = float(os.getenv('CONFIRM_TIMEOUT', '15'))  # seconds
+COMPOSER_TIMEOUT = float(os.getenv('COMPOSER_TIMEOUT', '15'))  # seconds
+POST_BUTTON_DEADLINE = float(os.getenv('POST_BUTTON_DEADLINE', '20'))  # seconds
+BUTTON_POLL_TIMEOUT = 2  # seconds to wait for the button to re-enable per attempt
+SHORTCUT_SEND_TIMEOUT = 2  # seconds for Ctrl+Enter to send CreateTweet before the button fallback
+
+COMPOSER_CLEARED_JS = """sel => {
+    const el = document.querySelector(sel);
+    return !el || el.innerText.trim() === '';
+}"""
+ENABLED_POST_BUTTON_JS = """() => Array.from(
+    document.querySelectorAll('[data-testid="tweetButtonInline"], [data-testid="tweetButton"]')
+).some(b => !b.disabled && b.getAttribute('aria-disabled') !== 'true')"""
+
+
+class PostRejectedError(Exception):
+    """X answered the CreateTweet request with an error; retrying the button will not help."""
+
+
+class _NotSent(Exception):
+    """submit() did not send a CreateTweet request in time."""
+
+
+def _is_create_tweet_request(request):
+    return '/CreateTweet' in request.url and request.method == 'POST'
+
+
+def _is_create_tweet_response(response):
+    return _is_create_tweet_request(response.request)
+
+
+def _extract_tweet_id(payload):
+    try:
+        return payload['data']['create_tweet']['tweet_results']['result']['rest_id']
+    except (KeyError, TypeError):
+        return None
+
 
 class TwitterWebClient:
     def __init__(self):
@@ -20,126 +75,333 @@ class TwitterWebClient:
         self.headless = HEADLESS
         if not self.username or not self.password:
             raise ValueError('Twitter username or password not set in environment variables.')
+        self.session = BrowserSession(
+            USER_DATA_DIR,
+            headless=self.headless,
+            home_url=HOME_URL,
+            ready_selector=TWEET_BOX_SELECTOR,
+            request_filter=RequestFilter(
+                first_party_domains=FIRST_PARTY_DOMAINS + (urlparse(TWITTER_BASE_URL).hostname,)
+            ),
+            on_launch=self._on_context_launch
+        )
+        self.post_button_locator = PostButtonLocator()
+        self.session_state = SessionStateCache()
+        self.diagnostics = Diagnostics()
+
+    def post_tweet_web(self, tweet_text: str, trace_id=None) -> dict:
+        """Post one tweet; `trace_id` ties its log lines and captures to the caller's post."""
+        return self.session.run(self._post_on_page, tweet_text, trace_id or new_trace_id())
+
+    def post_many(self, texts) -> list:
+        """
+        Post several independent tweets from one page. Returns one result per
+        text, in order; a failed post's result has an 'error' instead of an 'id'.
+        """
+        return self.session.run(self._post_many_on_page, list(texts))
+
+    def post_thread(self, texts) -> list:
+        """
+        Post texts as a reply chain: the first as a new tweet, each next one as
+        a reply to the previous. The chain stops at the first failure; later
+        parts get an 'error' result without being attempted. Every part is
+        confirmed from the CreateTweet response, whatever CONFIRM_MODE says,
+        because the next reply needs its id.
+        """
+        return self.session.run(self._post_thread_on_page, list(texts))
+
+    def close(self):
+        """Shut down the warm browser session."""
+        self.session.close()
+        self.diagnostics.close()
+
+    def _post_on_page(self, page, tweet_text: str, trace_id: str) -> dict:
+        result = self._compose_and_post(page, tweet_text, trace_id)
+        self._after_post_quietly(page)
+        return result
+
+    def _post_many_on_page(self, page, texts) -> list:
+        results = []
+        for text in texts:
+            results.append(self._timed_post(lambda: self._compose_and_post(page, text, new_trace_id()), text))
+        self._after_post_quietly(page)
+        return results
+
+    def _post_thread_on_page(self, page, texts) -> list:
+        results = []
+        parent_id = None
+        for i, text in enumerate(texts):
+            if i == 0:
+                result = self._timed_post(lambda: self._compose_and_post(page, text, new_trace_id(), need_id=True), text)
+            elif parent_id is None:
+                result = {'text': text, 'error': 'not posted: the previous part of the thread failed or has no id'}
+            else:
+                result = self._timed_post(lambda: self._reply_and_post(page, text, parent_id, new_trace_id(), need_id=True), text)
+                if 'error' not in result:
+                    result['in_reply_to'] = parent_id
+            parent_id = result.get('id')
+            results.append(result)
+        self._after_post_quietly(page)
+        return results
+
+    def _timed_post(self, post, tweet_text):
+        """Run one post of a bulk call; failures become an 'error' result."""
+        start = time.monotonic()
+        try:
+            result = post()
+        except Exception as e:
+            logger.error(f"[Bulk] {e}")
+            result = {'text': tweet_text, 'error': str(e)}
+        result['elapsed_ms'] = round((time.monotonic() - start) * 1000)
+        return result
+
+    def _after_post_quietly(self, page):
+        try:
+            self._after_post(page)
+        except Exception as e:
+            logger.debug(f"[Session] Could not update session state: {e}")
+
+    def _compose_and_post(self, page, tweet_text: str, trace_id: str, need_id=False) -> dict:
+        with log_context(post_id=trace_id):
+            try:
+                # Reuse the warm page; only navigate when it is stale. Login is judged from
+                # the auth cookies; the slow selector check only runs when they are invalid.
+                trusted_cookies = self.session_state.is_valid(page.context.cookies())
+                if self.session.warm(page) and not trusted_cookies:
+                    self._ensure_logged_in(page)
+                tweet_box = self._find_tweet_box(page)
+                if tweet_box is None and trusted_cookies and not self._is_logged_in(page):
+                    # The cookies looked fine but X no longer accepts them
+                    logger.warning("[Session] Saved session rejected by X, logging in again.")
+                    self.session_state.invalidate()
+                    self._ensure_logged_in(page)
+                    tweet_box = self._find_tweet_box(page)
+                if tweet_box is None:
+                    raise Exception("Main tweet input box not found on /home.")
+
+                return self._fill_and_submit(page, tweet_box, tweet_text, trace_id, need_id)
+            except Exception as e:
+                return self._post_failed(page, tweet_text, trace_id, e, need_id)
 
-    def post_tweet_web(self, tweet_text: str) -> dict:
-        with sync_playwright() as p:
-            browser = p.chromium.launch_persistent_context(
-                USER_DATA_DIR,
-                headless=self.headless,
-                args=["--start-maximized"]
-            )
-            page = browser.new_page()
+    def _reply_and_post(self, page, tweet_text: str, parent_id: str, trace_id: str, need_id=False) -> dict:
+        """Post tweet_text as a reply from the status page of parent_id."""
+        with log_context(post_id=trace_id):
             try:
-                page.goto('https://twitter.com/home', timeout=60000)
-                # Check login
-                if not self._is_logged_in(page):
-                    self._login(page)
-                # Always scroll to the top of the home feed before clicking the tweet box
-                tweet_box = None
-                for attempt in range(2):
-                    page.goto('https://twitter.com/home', timeout=60000)
-                    time.sleep(2)
-                    if '/home' not in page.url:
-                        continue
-                    page.evaluate('window.scrollTo(0, 0)')
-                    tweet_box = page.query_selector('div[aria-label="Tweet text"]')
-                    if tweet_box and tweet_box.is_visible() and tweet_box.is_enabled():
-                        break
-                    tweet_box = page.query_selector('div[data-testid="tweetTextarea_0"]')
-                    if tweet_box and tweet_box.is_visible() and tweet_box.is_enabled():
-                        break
-                    time.sleep(2)
-                if not tweet_box or '/home' not in page.url:
-                    page.screenshot(path="tweet_box_not_found.png", full_page=True)
-                    raise Exception("Main tweet input box not found on /home. See screenshot: tweet_box_not_found.png")
-
-                tweet_box.click()
-                time.sleep(0.5)
+                with metrics.span('navigation'):
+                    page.goto(STATUS_URL.format(tweet_id=parent_id), timeout=60000)
                 try:
-                    tweet_box.fill(tweet_text)
-                    print('[DEBUG] Used fill() to enter tweet')
-                except Exception:
-                    tweet_box.type(tweet_text)
-                    print('[DEBUG] Used type() to enter tweet')
-                time.sleep(1)
-
-                # Try to post using keyboard shortcut first (Ctrl+Enter)
+                    reply_box = page.wait_for_selector(TWEET_BOX_SELECTOR, state='visible', timeout=COMPOSER_TIMEOUT * 1000)
+                except PlaywrightTimeoutError:
+                    raise Exception(f"Reply box not found on the status page of {parent_id}.")
+                return self._fill_and_submit(page, reply_box, tweet_text, trace_id, need_id)
+            except Exception as e:
+                return self._post_failed(page, tweet_text, trace_id, e, need_id)
+
+    def _fill_and_submit(self, page, tweet_box, tweet_text: str, trace_id: str, need_id=False) -> dict:
+        with metrics.span('fill'):
+            tweet_box.click()
+            try:
+                tweet_box.fill(tweet_text)
+                logger.debug('[Post] Used fill() to enter tweet', extra={'stage': 'fill'})
+            except Exception:
+                tweet_box.type(tweet_text)
+                logger.debug('[Post] Used type() to enter tweet', extra={'stage': 'fill'})
+
+        # Try to post using keyboard shortcut first (Ctrl+Enter)
+        try:
+            logger.debug('[Post] Trying to post tweet using keyboard shortcut Ctrl+Enter', extra={'stage': 'shortcut'})
+            confirmed = self._submit_and_confirm(page, lambda: page.keyboard.press('Control+Enter'), need_id,
+                                                 send_timeout=SHORTCUT_SEND_TIMEOUT)
+            if confirmed:
+                logger.debug('[Post] Tweet posted successfully using keyboard shortcut', extra={'stage': 'shortcut'})
+                return self._result(tweet_text, *confirmed)
+        except PostRejectedError:
+            raise
+        except Exception as e:
+            logger.debug(f'[Post] Exception using keyboard shortcut: {e}', extra={'stage': 'shortcut'})
+        self.diagnostics.capture(page, trace_id, 'shortcut_unconfirmed')
+        metrics.inc('post_button_fallbacks')
+
+        # Fallback: locate the Post button in one in-page pass per attempt
+        deadline = time.monotonic() + POST_BUTTON_DEADLINE
+        post_attempt = 0
+        while time.monotonic() < deadline:
+            post_attempt += 1
+            button, reason = self.post_button_locator.locate(page)
+            if button is not None:
+                logger.debug('[Post] Clicking main tweet/post button in composer',
+                             extra={'stage': 'post_button', 'attempt': post_attempt})
                 try:
-                    print('[DEBUG] Trying to post tweet using keyboard shortcut Ctrl+Enter')
-                    page.keyboard.press('Control+Enter')
-                    time.sleep(2)
-                    # Check if tweet box is cleared (tweet posted)
-                    if tweet_box.inner_text().strip() == '':
-                        print('[DEBUG] Tweet posted successfully using keyboard shortcut')
-                        return {'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'text': tweet_text}
+                    confirmed = self._submit_and_confirm(page, button.click, need_id)
+                except PostRejectedError:
+                    raise
                 except Exception as e:
-                    print(f'[DEBUG] Exception using keyboard shortcut: {e}')
-                page.screenshot(path='post_shortcut_attempt.png', full_page=True)
-
-                # Fallback: Try all robust selectors for the Post button (2025 UI)
-                for post_attempt in range(10):
-                    post_buttons = []
-                    post_buttons += page.query_selector_all('div[aria-label="Tweet text"] button[aria-label="Post"]')
-                    post_buttons += page.query_selector_all('div[aria-label="Tweet text"] button[data-testid="tweetButtonInline"]')
-                    post_buttons += page.query_selector_all('div[data-testid="tweetTextarea_0"] button[data-testid="tweetButtonInline"]')
-                    post_buttons += page.query_selector_all('div[aria-label="Tweet text"] button[type="submit"]')
-                    post_buttons += page.query_selector_all('div[data-testid="tweetTextarea_0"] button[type="submit"]')
-                    post_buttons += page.query_selector_all('div[aria-label="Tweet text"] button:has-text("Post")')
-                    post_buttons += page.query_selector_all('div[data-testid="tweetTextarea_0"] button:has-text("Post")')
-                    post_buttons += page.query_selector_all('div[aria-label="Tweet text"] [role="button"]:has-text("Post")')
-                    post_buttons += page.query_selector_all('div[data-testid="tweetTextarea_0"] [role="button"]:has-text("Post")')
-
-                    found_enabled = False
-                    for btn in post_buttons:
-                        try:
-                            is_disabled = btn.get_attribute('disabled') is not None or btn.get_attribute('aria-disabled') == 'true'
-                            parent_html = btn.evaluate('node => node.closest("section") ? node.closest("section").outerHTML : ""')
-                            if (
-                                not is_disabled and btn.is_enabled() and btn.is_visible()
-                                and 'reply' not in parent_html.lower()
-                                and 'modal' not in parent_html.lower()
-                                and 'thread' not in parent_html.lower()
-                            ):
-                                print('[DEBUG] Clicking main tweet/post button in composer (robust selectors)')
-                                btn.click()
-                                time.sleep(2)
-                                # Check if tweet box is cleared (tweet posted)
-                                if tweet_box.inner_text().strip() == '':
-                                    print('[DEBUG] Tweet posted successfully by clicking button')
-                                    return {'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'text': tweet_text}
-                            if not is_disabled:
-                                found_enabled = True
-                        except Exception as e:
-                            print(f'[DEBUG] Exception while checking post button: {e}')
-                    if not found_enabled:
-                        print('[DEBUG] Post button still disabled or not found, retrying...')
-                        tweet_box.click()
-                        time.sleep(0.5)
-                        tweet_box.type(' ')
-                        tweet_box.press('Backspace')
-                        time.sleep(1)
-                        page.screenshot(path=f'post_button_disabled_attempt_{post_attempt+1}.png', full_page=True)
-                    time.sleep(1)
-                page.screenshot(path="tweet_button_not_found.png", full_page=True)
-                raise Exception('Main tweet/post button not found or not enabled on /home. See screenshot: tweet_button_not_found.png')
+                    logger.debug(f'[Post] Exception while clicking post button: {e}',
+                                 extra={'stage': 'post_button', 'attempt': post_attempt})
+                    confirmed = None
+                if confirmed:
+                    logger.debug('[Post] Tweet posted successfully by clicking button',
+                                 extra={'stage': 'post_button', 'attempt': post_attempt})
+                    return self._result(tweet_text, *confirmed)
+                continue
+            logger.debug(f'[Post] Post button not clickable ({reason}), retrying...',
+                         extra={'stage': 'post_button', 'attempt': post_attempt})
+            metrics.inc('post_button_retries')
+            tweet_box.click()
+            tweet_box.type(' ')
+            tweet_box.press('Backspace')
+            self.diagnostics.capture(page, trace_id, f'button_attempt_{post_attempt}', reason)
+            # Wait for the composer to re-enable its button instead of sleeping a fixed time
+            try:
+                page.wait_for_function(
+                    ENABLED_POST_BUTTON_JS,
+                    timeout=max(1, min(BUTTON_POLL_TIMEOUT, deadline - time.monotonic())) * 1000
+                )
+            except PlaywrightTimeoutError:
+                pass
+        raise Exception('Tweet/post button not found or not enabled in the composer.')
 
-            except Exception as e:
-                # Fallback: If the error is 'Element is not attached to the DOM' after posting, treat as success
-                if 'Element is not attached to the DOM' in str(e):
-                    print('[DEBUG] DOM detached error after post, assuming tweet was posted successfully.')
-                    return {'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'text': tweet_text}
-                browser.close()
-                raise Exception(f"Failed to post tweet via web: {e}")
+    def _post_failed(self, page, tweet_text, trace_id, e, need_id=False):
+        # Fallback: If the error is 'Element is not attached to the DOM' after posting, treat as success
+        # (not when the caller needs the tweet id, e.g. to reply to it)
+        if not need_id and 'Element is not attached to the DOM' in str(e):
+            logger.warning('[Post] DOM detached error after post, assuming tweet was posted successfully.')
+            return self._result(tweet_text, None, None)
+        capture = self.diagnostics.capture(page, trace_id, 'post_failed', str(e), failure=True)
+        detail = f" (trace {trace_id}, see {capture})" if capture else f" (trace {trace_id})"
+        if isinstance(e, PostRejectedError):
+            raise PostRejectedError(f"{e}{detail}") from e
+        raise Exception(f"Failed to post tweet via web: {e}{detail}")
 
-    def _is_logged_in(self, page):
+    def _find_tweet_box(self, page):
+        """Return the visible, enabled composer on /home, or None."""
+        with metrics.span('composer_locate'):
+            for attempt in range(2):
+                if attempt > 0 or '/home' not in page.url:
+                    with metrics.span('navigation'):
+                        page.goto(HOME_URL, timeout=60000)
+                if '/home' not in page.url:
+                    continue
+                try:
+                    tweet_box = page.wait_for_selector(TWEET_BOX_SELECTOR, state='visible', timeout=COMPOSER_TIMEOUT * 1000)
+                except PlaywrightTimeoutError:
+                    continue
+                if tweet_box and tweet_box.is_enabled():
+                    return tweet_box
+        return None
+
+    def _submit_and_confirm(self, page, submit, need_id=False, send_timeout=None):
+        """
+        Trigger submit() and wait for evidence that the tweet was created, up to
+        CONFIRM_TIMEOUT seconds. In 'network' mode this is the CreateTweet response,
+        in 'dom' mode the composer being cleared; need_id forces 'network' mode,
+        the only one that learns the new tweet's id. With send_timeout the wait
+        ends after that many seconds unless submit() sent a CreateTweet request.
+        Returns (tweet_id, latency_ms) on success or None when nothing was confirmed.
+        """
+        start = time.monotonic()
+        if send_timeout is not None:
+            submit = self._sending(page, submit, send_timeout)
+        if CONFIRM_MODE == 'network' or need_id:
+            try:
+                with page.expect_response(_is_create_tweet_response, timeout=CONFIRM_TIMEOUT * 1000) as response_info:
+                    with metrics.span('submit'):
+                        submit()
+                response = response_info.value
+            except _NotSent:
+                return None
+            except PlaywrightTimeoutError:
+                metrics.inc('confirm_timeouts')
+                return None
+            latency_ms = round((time.monotonic() - start) * 1000)
+            metrics.observe('confirm', latency_ms)
+            try:
+                payload = response.json()
+            except Exception:
+                payload = {}
+            if not response.ok or payload.get('errors'):
+                errors = payload.get('errors') or [{'message': f'HTTP {response.status}'}]
+                raise PostRejectedError(f"X rejected the tweet: {errors[0].get('message')}")
+            return _extract_tweet_id(payload), latency_ms
         try:
-            page.wait_for_selector('a[aria-label="Profile"], a[aria-label="Profiel"]', timeout=8000)
-            return True
+            with metrics.span('submit'):
+                submit()
+        except _NotSent:
+            return None
+        try:
+            page.wait_for_function(COMPOSER_CLEARED_JS, arg=TWEET_BOX_SELECTOR, timeout=CONFIRM_TIMEOUT * 1000)
         except PlaywrightTimeoutError:
-            return False
+            metrics.inc('confirm_timeouts')
+            return None
+        latency_ms = round((time.monotonic() - start) * 1000)
+        metrics.observe('confirm', latency_ms)
+        return None, latency_ms
+
+    def _sending(self, page, submit, timeout):
+        """Wrap submit() to raise _NotSent unless a CreateTweet request goes out within timeout seconds."""
+        def run():
+            try:
+                with page.expect_request(_is_create_tweet_request, timeout=timeout * 1000):
+                    submit()
+            except PlaywrightTimeoutError:
+                metrics.inc('submit_not_sent')
+                raise _NotSent()
+        return run
+
+    def _result(self, tweet_text, tweet_id, latency_ms):
+        logger.info(f"[Post] Tweet confirmed (id={tweet_id})", extra={'stage': 'confirmed', 'duration_ms': latency_ms})
+        return {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'text': tweet_text,
+            'id': tweet_id,
+            'latency_ms': latency_ms
+        }
+
+    def _on_context_launch(self, context):
+        self.session_state.seed(context)
+
+    def _ensure_logged_in(self, page):
+        if not self._is_logged_in(page):
+            self._login(page)
+            self.session_state.save(page.context)
+
+    def _after_post(self, page):
+        """Keep the saved session state fresh; runs on the browser thread after a post."""
+        cookies = page.context.cookies()
+        if self.session_state.needs_refresh(cookies):
+            # Refresh in the background so the post itself is not delayed
+            threading.Thread(target=self.refresh_session, name='session-refresh', daemon=True).start()
+        else:
+            self.session_state.save(page.context, force=False)
+
+    def refresh_session(self):
+        """Reload /home so X reissues the auth cookies, then save the new state."""
+        def refresh(page):
+            with metrics.span('session_refresh'):
+                page.goto(HOME_URL, timeout=60000)
+                self._ensure_logged_in(page)
+                self.session_state.save(page.context)
+        try:
+            self.session.run(refresh)
+            logger.info("[Session] Refreshed saved session state.")
+        except Exception as e:
+            logger.warning(f"[Session] Session refresh failed: {e}")
+
+    def _is_logged_in(self, page):
+        with metrics.span('is_logged_in'):
+            try:
+                page.wait_for_selector('a[aria-label="Profile"], a[aria-label="Profiel"]', timeout=8000)
+                return True
+            except PlaywrightTimeoutError:
+                return False
 
     def _login(self, page):
-        page.goto('https://twitter.com/login', timeout=60000)
+        with metrics.span('login'):
+            self._login_flow(page)
+        metrics.inc('logins')
+
+    def _login_flow(self, page):
+        page.goto(LOGIN_URL, timeout=60000)
         page.wait_for_selector('input[name="text"]', timeout=20000)
         page.fill('input[name="text"]', self.username)
         page.keyboard.press('Enter')